@@ -2,21 +2,13 @@
 
 """graphbin: Refined binning of metagenomic contigs using assembly graphs."""
 
+import importlib
 import logging
 import os
 import sys
 
 import click
 
-from graphbin import (
-    graphbin_Canu,
-    graphbin_Flye,
-    graphbin_MEGAHIT,
-    graphbin_Miniasm,
-    graphbin_SGA,
-    graphbin_SPAdes,
-)
-
 
 __author__ = "Vijini Mallawaarachchi"
 __copyright__ = "Copyright 2019-2022, GraphBin Project"
@@ -28,6 +20,17 @@ __email__ = "viji.mallawaarachchi@gmail.com"
 __status__ = "Production"
 
 
+# Runner of each assembler type, imported only when GraphBin runs on it
+ASSEMBLER_RUNNERS = {
+    "spades": "graphbin.graphbin_SPAdes",
+    "sga": "graphbin.graphbin_SGA",
+    "megahit": "graphbin.graphbin_MEGAHIT",
+    "flye": "graphbin.graphbin_Flye",
+    "canu": "graphbin.graphbin_Canu",
+    "miniasm": "graphbin.graphbin_Miniasm",
+}
+
+
 class ArgsObj:
     def __init__(
         self,
@@ -41,6 +44,25 @@ class ArgsObj:
         max_iteration,
         diff_threshold,
         delimiter,
+        checkpoint,
+        checkpoint_interval,
+        resume,
+        warm_start,
+        active_set,
+        active_tol,
+        components,
+        nthreads,
+        f_storage,
+        f_top_k,
+        edge_weighting,
+        stable_iterations,
+        convergence_log,
+        min_bin_count,
+        bin_removal,
+        columnar,
+        table_only,
+        bin_layout,
+        compress_bins,
     ):
         self.assembler = assembler
         self.graph = graph
@@ -52,15 +74,71 @@ class ArgsObj:
         self.max_iteration = max_iteration
         self.diff_threshold = diff_threshold
         self.delimiter = delimiter
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.warm_start = warm_start
+        self.active_set = active_set
+        self.active_tol = active_tol
+        self.components = components
+        self.nthreads = nthreads
+        self.f_storage = f_storage
+        self.f_top_k = f_top_k
+        self.edge_weighting = edge_weighting
+        self.stable_iterations = stable_iterations
+        self.convergence_log = convergence_log
+        self.min_bin_count = min_bin_count
+        self.bin_removal = bin_removal
+        self.columnar = columnar
+        self.table_only = table_only
+        self.bin_layout = bin_layout
+        self.compress_bins = compress_bins
 
 
-@click.command()
+class ExtractArgsObj:
+    def __init__(
+        self,
+        contigs,
+        binned,
+        output,
+        prefix,
+        delimiter,
+        bins,
+        bin_layout,
+        compress_bins,
+    ):
+        self.contigs = contigs
+        self.binned = binned
+        self.output = output
+        self.prefix = prefix
+        self.delimiter = delimiter
+        self.bins = bins
+        self.bin_layout = bin_layout
+        self.compress_bins = compress_bins
+
+
+class GraphBinCommand(click.Command):
+    # graphbin runs GraphBin itself and graphbin <subcommand> runs one of the
+    # commands in SUBCOMMANDS (e.g. graphbin extract)
+    def main(self, args=None, prog_name=None, **kwargs):
+        args = list(sys.argv[1:] if args is None else args)
+
+        if len(args) > 0 and args[0] in SUBCOMMANDS:
+            return SUBCOMMANDS[args[0]].main(
+                args[1:], prog_name=f"{prog_name or 'graphbin'} {args[0]}", **kwargs
+            )
+
+        return super().main(args, prog_name=prog_name, **kwargs)
+
+
+@click.command(
+    cls=GraphBinCommand,
+    epilog="Run graphbin extract --help to see how to write the .fasta files of chosen bins from a binning result.",
+)
 @click.option(
     "--assembler",
     help="name of the assembler used (SPAdes, SGA or MEGAHIT). GraphBin supports Flye, Canu and Miniasm long-read assemblies as well.",
-    type=click.Choice(
-        ["spades", "sga", "megahit", "flye", "canu", "miniasm"], case_sensitive=False
-    ),
+    type=click.Choice(list(ASSEMBLER_RUNNERS), case_sensitive=False),
     required=True,
 )
 @click.option(
@@ -77,7 +155,7 @@ class ArgsObj:
 )
 @click.option(
     "--paths",
-    help="path to the contigs.paths (metaSPAdes) or assembly.info (metaFlye) file",
+    help="path to the contigs.paths (metaSPAdes) or assembly.info (metaFlye) file. Not needed if the assembly graph has P or W lines with the contig paths. The P lines of metaSPAdes are scaffold paths and need the scaffolds as --contigs",
     type=click.Path(exists=True),
     required=False,
 )
@@ -123,6 +201,144 @@ class ArgsObj:
     show_default=True,
     required=False,
 )
+@click.option(
+    "--checkpoint",
+    help="path to a file to periodically save the label propagation state to",
+    type=click.Path(dir_okay=False, writable=True),
+    required=False,
+)
+@click.option(
+    "--checkpoint_interval",
+    help="number of label propagation iterations between checkpoints",
+    type=int,
+    default=10,
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--resume",
+    help="resume label propagation from the checkpoint file if it exists",
+    is_flag=True,
+    default=False,
+    show_default=True,
+)
+@click.option(
+    "--warm_start",
+    help="path to a checkpoint file of a previous run to seed label propagation from",
+    type=click.Path(exists=True, dir_okay=False),
+    required=False,
+)
+@click.option(
+    "--active_set",
+    help="only recompute vertices whose neighbours changed in the previous label propagation iteration",
+    is_flag=True,
+    default=False,
+    show_default=True,
+)
+@click.option(
+    "--active_tol",
+    help="minimum change of a vertex for its neighbours to be recomputed when using --active_set",
+    type=click.FloatRange(0, None),
+    default=1e-6,
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--components",
+    help="run label propagation independently on each connected component of the assembly graph",
+    is_flag=True,
+    default=False,
+    show_default=True,
+)
+@click.option(
+    "--nthreads",
+    help="number of processes to use for label propagation with --components",
+    type=int,
+    default=1,
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--f_storage",
+    help="storage of the label scores in label propagation. float32 halves the memory of dense, sparse keeps only the top f_top_k label scores of each contig",
+    type=click.Choice(["dense", "float32", "sparse"], case_sensitive=False),
+    default="dense",
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--f_top_k",
+    help="number of label scores kept for each contig with --f_storage sparse",
+    type=click.IntRange(1, None),
+    default=10,
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--edge_weighting",
+    help="weighting of the assembly graph edges in label propagation. coverage is supported for SPAdes, MEGAHIT and Flye, overlap for SGA, MEGAHIT, Canu and Miniasm",
+    type=click.Choice(["uniform", "coverage", "overlap"], case_sensitive=False),
+    default="uniform",
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--stable_iterations",
+    help="stop label propagation once no contig changed its label for this many iterations",
+    type=click.IntRange(1, None),
+    required=False,
+)
+@click.option(
+    "--convergence_log",
+    help="path to a .tsv file to write the per-iteration convergence diagnostics of label propagation to",
+    type=click.Path(dir_okay=False, writable=True),
+    required=False,
+)
+@click.option(
+    "--min_bin_count",
+    help="minimum number of contigs a bin keeps when removing labels of ambiguous contigs",
+    type=click.IntRange(1, None),
+    default=10,
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--bin_removal",
+    help="order in which ambiguous contigs of a bin are removed. ordered follows the initial binning result, ranked removes contigs with the most neighbours in other bins first",
+    type=click.Choice(["ordered", "ranked"], case_sensitive=False),
+    default="ordered",
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--columnar",
+    help="also write the binning result of every contig as NumPy arrays to graphbin_output.npz",
+    is_flag=True,
+    default=False,
+    show_default=True,
+)
+@click.option(
+    "--table_only",
+    help="only write the binning result and not the .fasta files of the bins. The .fasta files can be written later with graphbin extract",
+    is_flag=True,
+    default=False,
+    show_default=True,
+)
+@click.option(
+    "--bin_layout",
+    help="layout of the .fasta files of the bins. files writes one .fasta file per bin, single writes all bins to one .fasta file grouped by bin with an index of the bins",
+    type=click.Choice(["files", "single"], case_sensitive=False),
+    default="files",
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--compress_bins",
+    help="gzip the .fasta files of the bins. Each bin is compressed separately, so that bins can still be read on their own with --bin_layout single",
+    is_flag=True,
+    default=False,
+    show_default=True,
+)
 @click.version_option(__version__, "-v", "--version", is_flag=True)
 def main(
     assembler,
@@ -135,6 +351,25 @@ def main(
     max_iteration,
     diff_threshold,
     delimiter,
+    checkpoint,
+    checkpoint_interval,
+    resume,
+    warm_start,
+    active_set,
+    active_tol,
+    components,
+    nthreads,
+    f_storage,
+    f_top_k,
+    edge_weighting,
+    stable_iterations,
+    convergence_log,
+    min_bin_count,
+    bin_removal,
+    columnar,
+    table_only,
+    bin_layout,
+    compress_bins,
 ):
     """
     GraphBin: Refined Binning of Metagenomic Contigs using Assembly Graphs
@@ -163,18 +398,6 @@ def main(
     # Validate options
     # ---------------------------------------------------
 
-    # Check if paths files is provided when the assembler type is SPAdes
-    if assembler.lower() == "spades" and paths is None:
-        logger.error("Please make sure to provide the path to the contigs.paths file.")
-        logger.info("Exiting GraphBin... Bye...!")
-        sys.exit(1)
-
-    # Check if paths files is provided when the assembler type is Flye
-    if assembler.lower() == "flye" and paths is None:
-        logger.error("Please make sure to provide the path to the contigs.paths file.")
-        logger.info("Exiting GraphBin... Bye...!")
-        sys.exit(1)
-
     # Validate prefix
     if prefix != None:
         if not prefix.endswith("_"):
@@ -194,6 +417,32 @@ def main(
         logger.info("Exiting GraphBin... Bye...!")
         sys.exit(1)
 
+    # Validate checkpoint_interval
+    if checkpoint_interval <= 0:
+        logger.error("Please enter a valid number for checkpoint_interval")
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    # Check if a checkpoint file is provided when resuming
+    if resume and checkpoint is None:
+        logger.error("Please provide the checkpoint file to resume from.")
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    # Validate nthreads
+    if nthreads <= 0:
+        logger.error("Please enter a valid number for nthreads")
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    # Checkpoints are not supported when propagating per component
+    if components and (checkpoint is not None or warm_start is not None):
+        logger.error(
+            "Checkpoints cannot be used when running label propagation on each connected component."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
     # Make args object
     args = ArgsObj(
         assembler,
@@ -206,22 +455,31 @@ def main(
         max_iteration,
         diff_threshold,
         delimiter,
+        checkpoint,
+        checkpoint_interval,
+        resume,
+        warm_start,
+        active_set,
+        active_tol,
+        components,
+        nthreads,
+        f_storage,
+        f_top_k,
+        edge_weighting,
+        stable_iterations,
+        convergence_log,
+        min_bin_count,
+        bin_removal,
+        columnar,
+        table_only,
+        bin_layout,
+        compress_bins,
     )
 
     # Run GraphBin
     # ---------------------------------------------------
-    if assembler.lower() == "canu":
-        graphbin_Canu.main(args)
-    if assembler.lower() == "flye":
-        graphbin_Flye.main(args)
-    if assembler.lower() == "megahit":
-        graphbin_MEGAHIT.main(args)
-    if assembler.lower() == "miniasm":
-        graphbin_Miniasm.main(args)
-    if assembler.lower() == "sga":
-        graphbin_SGA.main(args)
-    if assembler.lower() == "spades":
-        graphbin_SPAdes.main(args)
+    runner = importlib.import_module(ASSEMBLER_RUNNERS[assembler.lower()])
+    runner.main(args)
 
     # Exit program
     # --------------
@@ -232,5 +490,132 @@ def main(
     logger.removeHandler(consoleHeader)
 
 
+@click.command()
+@click.option(
+    "--contigs",
+    help="path to the contigs file",
+    type=click.Path(exists=True),
+    required=True,
+)
+@click.option(
+    "--binned",
+    help="path to the .csv file with the binning result of GraphBin",
+    type=click.Path(exists=True),
+    required=True,
+)
+@click.option(
+    "--output",
+    help="path to the output folder",
+    type=click.Path(dir_okay=True, writable=True, readable=True),
+    required=True,
+)
+@click.option(
+    "--prefix",
+    help="prefix for the output file",
+    type=str,
+    required=False,
+)
+@click.option(
+    "--delimiter",
+    help="delimiter for input/output results. Supports a comma (,), a semicolon (;), a tab ($'\\t'), a space (\" \") and a pipe (|)",
+    type=click.Choice([",", ";", "$'\\t'", '" "'], case_sensitive=False),
+    default=",",
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--bins",
+    help="name of a bin to write the .fasta file of. Can be given multiple times. The .fasta files of all bins are written if not given",
+    type=str,
+    multiple=True,
+    required=False,
+)
+@click.option(
+    "--bin_layout",
+    help="layout of the .fasta files of the bins. files writes one .fasta file per bin, single writes all bins to one .fasta file grouped by bin with an index of the bins",
+    type=click.Choice(["files", "single"], case_sensitive=False),
+    default="files",
+    show_default=True,
+    required=False,
+)
+@click.option(
+    "--compress_bins",
+    help="gzip the .fasta files of the bins. Each bin is compressed separately, so that bins can still be read on their own with --bin_layout single",
+    is_flag=True,
+    default=False,
+    show_default=True,
+)
+@click.version_option(__version__, "-v", "--version", is_flag=True)
+def extract(
+    contigs,
+    binned,
+    output,
+    prefix,
+    delimiter,
+    bins,
+    bin_layout,
+    compress_bins,
+):
+    """
+    GraphBin extract: Write the .fasta files of refined bins from a GraphBin binning result
+    """
+
+    # Setup logger
+    # ---------------------------------------------------
+
+    logger = logging.getLogger(f"GraphBin {__version__}")
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    consoleHeader = logging.StreamHandler()
+    consoleHeader.setFormatter(formatter)
+    consoleHeader.setLevel(logging.INFO)
+    logger.addHandler(consoleHeader)
+
+    # Validate prefix
+    if prefix != None:
+        if not prefix.endswith("_"):
+            prefix = prefix + "_"
+    else:
+        prefix = ""
+
+    fileHandler = logging.FileHandler(f"{output}{prefix}graphbin_extract.log")
+    fileHandler.setLevel(logging.DEBUG)
+    fileHandler.setFormatter(formatter)
+    logger.addHandler(fileHandler)
+
+    logger.info(
+        "Welcome to GraphBin: Refined Binning of Metagenomic Contigs using Assembly Graphs."
+    )
+
+    # Make args object
+    args = ExtractArgsObj(
+        contigs,
+        binned,
+        output,
+        prefix,
+        delimiter,
+        bins,
+        bin_layout,
+        compress_bins,
+    )
+
+    # Write the .fasta files of the bins
+    # ---------------------------------------------------
+    runner = importlib.import_module("graphbin.graphbin_extract")
+    runner.main(args)
+
+    # Exit program
+    # --------------
+
+    logger.info("Thank you for using GraphBin! Bye...!")
+
+    logger.removeHandler(fileHandler)
+    logger.removeHandler(consoleHeader)
+
+
+# Commands run as graphbin <subcommand>
+SUBCOMMANDS = {"extract": extract}
+
+
 if __name__ == "__main__":
     main()
@@ -15,7 +15,6 @@ import logging
 import time
 
 from graphbin.graphbin_Func import graphbin_main
-from graphbin.parsers import get_initial_bin_count
 from graphbin.parsers.canu_parser import (
     get_initial_binning_result,
     parse_graph,
@@ -44,6 +43,25 @@ def run(args):
     delimiter = args.delimiter
     max_iteration = args.max_iteration
     diff_threshold = args.diff_threshold
+    checkpoint_file = args.checkpoint
+    checkpoint_interval = args.checkpoint_interval
+    resume = args.resume
+    warm_start_file = args.warm_start
+    active_set = args.active_set
+    active_tol = args.active_tol
+    components = args.components
+    nthreads = args.nthreads
+    f_storage = args.f_storage.lower()
+    f_top_k = args.f_top_k
+    edge_weighting = args.edge_weighting.lower()
+    stable_iterations = args.stable_iterations
+    convergence_log = args.convergence_log
+    min_bin_count = args.min_bin_count
+    bin_removal = args.bin_removal.lower()
+    columnar = args.columnar
+    table_only = args.table_only
+    bin_layout = args.bin_layout.lower()
+    compress_bins = args.compress_bins
     MIN_BIN_COUNT = 10
 
     # Setup logger
@@ -72,11 +90,6 @@ def run(args):
 
     logger.info("GraphBin started")
 
-    # Get the number of bins from the initial binning result
-    # --------------------------------------------------------
-
-    n_bins, bins_list = get_initial_bin_count(contig_bins_file, delimiter)
-
     # Get assembly graph
     # --------------------
 
@@ -85,14 +98,14 @@ def run(args):
     # Get initial binning result
     # ----------------------------
 
-    bins = get_initial_binning_result(
-        n_bins, bins_list, contig_bins_file, contigs_map.inverse, delimiter
+    n_bins, bins_list, bins = get_initial_binning_result(
+        contig_bins_file, contigs_map.inverse, node_count, delimiter
     )
 
     # Run GraphBin logic
     # -------------------------------------
 
-    final_bins, remove_labels, non_isolated = graphbin_main(
+    final_bins, removed, non_isolated, initial_bins, scores = graphbin_main(
         n_bins,
         bins,
         bins_list,
@@ -100,6 +113,21 @@ def run(args):
         node_count,
         diff_threshold,
         max_iteration,
+        checkpoint_file=checkpoint_file,
+        checkpoint_interval=checkpoint_interval,
+        resume=resume,
+        warm_start_file=warm_start_file,
+        active_set=active_set,
+        active_tol=active_tol,
+        components=components,
+        nthreads=nthreads,
+        f_storage=f_storage,
+        f_top_k=f_top_k,
+        edge_weighting=edge_weighting,
+        stable_iterations=stable_iterations,
+        convergence_log=convergence_log,
+        min_bin_count=min_bin_count,
+        bin_removal=bin_removal,
     )
 
     elapsed_time = time.time() - start_time
@@ -121,8 +149,14 @@ def run(args):
         bins_list,
         delimiter,
         node_count,
-        remove_labels,
+        removed,
         non_isolated,
+        initial_bins=initial_bins,
+        scores=scores,
+        columnar=columnar,
+        table_only=table_only,
+        bin_layout=bin_layout,
+        compress_bins=compress_bins,
     )
 
 
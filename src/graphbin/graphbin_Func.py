@@ -3,6 +3,10 @@
 import logging
 import sys
 
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
 from graphbin.labelpropagation.labelprop import LabelProp
 
 
@@ -19,22 +23,28 @@ logger = logging.getLogger(f"GraphBin {__version__}")
 
 MIN_BIN_COUNT = 10
 
+EDGE_WEIGHTING_SCHEMES = ["uniform", "coverage", "overlap"]
+
+BIN_REMOVAL_POLICIES = ["ordered", "ranked"]
+
 
 def getClosestLabelledVertices(graph, node, binned_contigs):
     # Remove labels of ambiguous vertices
     # -------------------------------------
 
+    # binned_contigs is a boolean array indexed by vertex id
+
     queu_l = [graph.neighbors(node, mode="ALL")]
-    visited_l = [node]
+    visited_l = set([node])
     labelled = []
 
     while len(queu_l) > 0:
         active_level = queu_l.pop(0)
         is_finish = False
-        visited_l += active_level
+        visited_l.update(active_level)
 
         for n in active_level:
-            if n in binned_contigs:
+            if binned_contigs[n]:
                 is_finish = True
                 labelled.append(n)
         if is_finish:
@@ -54,102 +64,209 @@ def getClosestLabelledVertices(graph, node, binned_contigs):
     return labelled
 
 
-def graphbin_main(
-    n_bins, bins, bins_list, assembly_graph, node_count, diff_threshold, max_iteration
+def get_edge_weights(assembly_graph, edge_weighting):
+    # Weight of each edge of the assembly graph (indexed by edge id)
+    # ----------------------------------------------------------------
+
+    if edge_weighting == "coverage":
+        # Contigs of the same genome have similar coverage. The ratio of the
+        # coverages is smoothed so that contigs without coverage keep their edges
+        coverages = assembly_graph.vs["coverage"]
+        edge_weights = []
+        for source, target in assembly_graph.get_edgelist():
+            cov_1, cov_2 = coverages[source], coverages[target]
+            edge_weights.append((min(cov_1, cov_2) + 1.0) / (max(cov_1, cov_2) + 1.0))
+        return edge_weights
+
+    if edge_weighting == "overlap":
+        # Longer overlaps are more reliable connections. Links without overlap
+        # information (or of zero length) get a weight of 1
+        return [overlap + 1.0 for overlap in assembly_graph.es["overlap"]]
+
+    return [1.0] * assembly_graph.ecount()
+
+
+def get_removable_vertices(
+    candidates,
+    bin_size,
+    n_removed,
+    min_bin_count,
+    bin_removal="ordered",
+    conflicts=None,
 ):
-    logger.info("Determining ambiguous vertices")
+    # Ambiguous vertices of a bin are removed while the bin still has at least
+    # min_bin_count vertices before each removal. ordered keeps the order of
+    # the candidates, ranked removes the vertices with the most conflicting
+    # neighbours first (conflicts, indexed by vertex) and breaks ties by
+    # vertex index
+    if bin_removal == "ranked":
+        if conflicts is None:
+            candidates = sorted(candidates)
+        else:
+            candidates = sorted(candidates, key=lambda v: (-conflicts[v], v))
+
+    n_removable = max(bin_size - n_removed - min_bin_count + 1, 0)
+
+    return candidates[:n_removable]
+
+
+def get_vertex_bins(bins, node_count):
+    # Bin of each vertex (-1 if not binned)
+    vertex_bins = np.full(node_count, -1, dtype=np.int64)
+    for b in range(len(bins)):
+        vertex_bins[bins[b]] = b
+
+    return vertex_bins
+
+
+def get_ambiguous_vertices(edges, vertex_bins):
+    # Number of neighbours of each vertex in a different bin. A binned vertex
+    # is ambiguous if it has any. Also returns whether each vertex has a
+    # binned neighbour
+    source_bins = vertex_bins[edges[:, 0]]
+    target_bins = vertex_bins[edges[:, 1]]
+    conflicting = (source_bins >= 0) & (target_bins >= 0) & (source_bins != target_bins)
 
-    remove_by_bin = {}
+    conflicts = np.bincount(edges[conflicting].ravel(), minlength=len(vertex_bins))
 
-    remove_labels = []
+    binned_neighbours = np.zeros(len(vertex_bins), dtype=bool)
+    binned_neighbours[edges[target_bins >= 0, 0]] = True
+    binned_neighbours[edges[source_bins >= 0, 1]] = True
 
-    neighbours_have_same_label_list = []
+    return conflicts, binned_neighbours
 
+
+def remove_bin_labels(bins, remove_by_bin, node_count):
+    # Drop the vertices to remove from each bin in place, keeping the order of
+    # the bins
+    removed = np.zeros(node_count, dtype=bool)
+    for remove_labels in remove_by_bin:
+        removed[remove_labels] = True
+
+    for b in range(len(bins)):
+        bins[b] = bins[b][~removed[bins[b]]]
+
+    return removed
+
+
+def remove_ambiguous_labels(
+    edges, bins, node_count, min_bin_count=MIN_BIN_COUNT, bin_removal="ordered"
+):
+    # Remove labels of vertices having a neighbour in a different bin from
+    # bins in place
+    conflicts, _ = get_ambiguous_vertices(edges, get_vertex_bins(bins, node_count))
+
+    remove_by_bin = [
+        get_removable_vertices(
+            members[conflicts[members] > 0].tolist(),
+            len(members),
+            0,
+            min_bin_count,
+            bin_removal,
+            conflicts,
+        )
+        for members in bins
+    ]
+
+    return remove_bin_labels(bins, remove_by_bin, node_count)
+
+
+def graphbin_main(
+    n_bins,
+    bins,
+    bins_list,
+    assembly_graph,
+    node_count,
+    diff_threshold,
+    max_iteration,
+    checkpoint_file=None,
+    checkpoint_interval=10,
+    resume=False,
+    warm_start_file=None,
+    active_set=False,
+    active_tol=1e-6,
+    components=False,
+    nthreads=1,
+    f_storage="dense",
+    f_top_k=10,
+    edge_weighting="uniform",
+    stable_iterations=None,
+    convergence_log=None,
+    min_bin_count=MIN_BIN_COUNT,
+    bin_removal="ordered",
+):
+    # Vertices of each bin in the order of the initial binning result. bins is
+    # updated in place to the final bins
     for b in range(n_bins):
-        for i in bins[b]:
-            my_bin = b
+        bins[b] = np.asarray(bins[b], dtype=np.int64)
 
-            # Get set of closest labelled vertices with distance = 1
-            closest_neighbours = assembly_graph.neighbors(i, mode="all")
+    # Initial bin of each vertex (-1 if not binned)
+    initial_bins = get_vertex_bins(bins, node_count)
 
-            # Determine whether all the closest labelled vertices have the same label as its own
-            neighbours_have_same_label = True
-
-            neighbours_binned = False
-
-            for neighbour in closest_neighbours:
-                for k in range(n_bins):
-                    if neighbour in bins[k]:
-                        neighbours_binned = True
-                        if k != my_bin:
-                            neighbours_have_same_label = False
-                            break
-
-            if not neighbours_have_same_label:
-                if my_bin in remove_by_bin:
-                    if len(bins[my_bin]) - len(remove_by_bin[my_bin]) >= MIN_BIN_COUNT:
-                        remove_labels.append(i)
-                        remove_by_bin[my_bin].append(i)
-                else:
-                    if len(bins[my_bin]) >= MIN_BIN_COUNT:
-                        remove_labels.append(i)
-                        remove_by_bin[my_bin] = [i]
-
-            elif neighbours_binned:
-                neighbours_have_same_label_list.append(i)
-
-    for i in remove_labels:
-        for n in range(n_bins):
-            if i in bins[n]:
-                bins[n].remove(i)
+    edge_list = assembly_graph.get_edgelist()
+    edges = np.array(edge_list, dtype=np.int64).reshape(-1, 2)
+
+    logger.info("Determining ambiguous vertices")
+
+    # Vertices with a neighbour in a different bin are removed. Vertices whose
+    # binned neighbours are all in their own bin are not checked again below
+    conflicts, binned_neighbours = get_ambiguous_vertices(edges, initial_bins)
+    same_label_neighbours = binned_neighbours & (conflicts == 0)
+
+    remove_by_bin = [
+        get_removable_vertices(
+            members[conflicts[members] > 0].tolist(),
+            len(members),
+            0,
+            min_bin_count,
+            bin_removal,
+            conflicts,
+        )
+        for members in bins
+    ]
+
+    remove_bin_labels(bins, remove_by_bin, node_count)
 
     # Further remove labels of ambiguous vertices
-    binned_contigs = []
+    vertex_bins = get_vertex_bins(bins, node_count)
+    binned_contigs = vertex_bins >= 0
+
+    further_remove_by_bin = []
 
-    for n in range(n_bins):
-        binned_contigs = sorted(binned_contigs + bins[n])
+    # Number of closest labelled vertices of each candidate in other bins
+    closest_conflicts = {}
 
     for b in range(n_bins):
-        for i in bins[b]:
-            if i not in neighbours_have_same_label_list:
-                my_bin = b
-
-                # Get set of closest labelled vertices
-                closest_neighbours = getClosestLabelledVertices(
-                    assembly_graph, i, binned_contigs
-                )
-
-                if len(closest_neighbours) > 0:
-                    # Determine whether all the closest labelled vertices have the same label as its own
-                    neighbours_have_same_label = True
-
-                    for neighbour in closest_neighbours:
-                        for k in range(n_bins):
-                            if neighbour in bins[k]:
-                                if k != my_bin:
-                                    neighbours_have_same_label = False
-                                    break
-
-                    if not neighbours_have_same_label and i not in remove_labels:
-                        if my_bin in remove_by_bin:
-                            if (
-                                len(bins[my_bin]) - len(remove_by_bin[my_bin])
-                                >= MIN_BIN_COUNT
-                            ):
-                                remove_labels.append(i)
-                                remove_by_bin[my_bin].append(i)
-                        else:
-                            if len(bins[my_bin]) >= MIN_BIN_COUNT:
-                                remove_labels.append(i)
-                                remove_by_bin[my_bin] = [i]
+        candidates = []
+
+        for i in bins[b][~same_label_neighbours[bins[b]]].tolist():
+            # Get set of closest labelled vertices
+            closest_neighbours = getClosestLabelledVertices(
+                assembly_graph, i, binned_contigs
+            )
+
+            # Determine whether all the closest labelled vertices have the same label as its own
+            if len(closest_neighbours) > 0:
+                n_conflicts = np.count_nonzero(vertex_bins[closest_neighbours] != b)
+                if n_conflicts > 0:
+                    candidates.append(i)
+                    closest_conflicts[i] = n_conflicts
+
+        further_remove_by_bin.append(
+            get_removable_vertices(
+                candidates,
+                len(bins[b]),
+                len(remove_by_bin[b]),
+                min_bin_count,
+                bin_removal,
+                closest_conflicts,
+            )
+        )
 
     logger.info("Removing labels of ambiguous vertices")
 
     # Remove labels of ambiguous vertices
-    for i in remove_labels:
-        for n in range(n_bins):
-            if i in bins[n]:
-                bins[n].remove(i)
+    remove_bin_labels(bins, further_remove_by_bin, node_count)
 
     logger.info("Obtaining the refined binning result")
 
@@ -160,99 +277,70 @@ def graphbin_main(
         "Deteremining vertices which are not isolated and not in components without any labels"
     )
 
-    non_isolated = []
-
-    for i in range(node_count):
-        if i not in non_isolated and i in binned_contigs:
-            component = []
-            component.append(i)
-            length = len(component)
-            neighbours = assembly_graph.neighbors(i, mode="all")
+    # Keep the vertices of connected components having a binned vertex
+    membership = np.array(assembly_graph.components().membership, dtype=np.int64)
 
-            for neighbor in neighbours:
-                if neighbor not in component:
-                    component.append(neighbor)
-
-            component = list(set(component))
+    labelled_components = np.zeros(
+        membership.max() + 1 if node_count > 0 else 0, dtype=bool
+    )
+    labelled_components[membership[binned_contigs]] = True
 
-            while length != len(component):
-                length = len(component)
+    is_non_isolated = labelled_components[membership]
 
-                for j in component:
-                    neighbours = assembly_graph.neighbors(j, mode="all")
+    logger.info(
+        "Number of non-isolated contigs: " + str(np.count_nonzero(is_non_isolated))
+    )
 
-                    for neighbor in neighbours:
-                        if neighbor not in component:
-                            component.append(neighbor)
+    # Run label propagation
+    # -----------------------
 
-            labelled = False
-            for j in component:
-                if j in binned_contigs:
-                    labelled = True
-                    break
+    if edge_weighting != "uniform":
+        attributes = (
+            assembly_graph.vs.attributes()
+            if edge_weighting == "coverage"
+            else assembly_graph.es.attributes()
+        )
+        if edge_weighting not in attributes:
+            logger.error(
+                f"The assembly graph does not provide {edge_weighting} information. Please use a different edge weighting scheme."
+            )
+            logger.info("Exiting GraphBin... Bye...!")
+            sys.exit(1)
 
-            if labelled:
-                for j in component:
-                    if j not in non_isolated:
-                        non_isolated.append(j)
+        logger.info(f"Weighting edges by {edge_weighting}")
 
-    logger.info("Number of non-isolated contigs: " + str(len(non_isolated)))
+    edge_weights = get_edge_weights(assembly_graph, edge_weighting)
 
-    # Run label propagation
-    # -----------------------
+    # Label of each vertex (bin index + 1, 0 if not binned). Contigs belonging
+    # to multiple bins are already reported by read_initial_binning
+    vertex_labels = get_vertex_bins(bins, node_count) + 1
 
     data = []
 
     for contig in range(node_count):
         # Consider vertices that are not isolated
 
-        if contig in non_isolated:
+        if is_non_isolated[contig]:
             line = []
             line.append(contig)
-
-            assigned = False
-
-            for i in range(n_bins):
-                if contig in bins[i]:
-                    line.append(i + 1)
-                    assigned = True
-
-            if not assigned:
-                line.append(0)
-
-            neighbours = assembly_graph.neighbors(contig, mode="all")
+            line.append(int(vertex_labels[contig]))
 
             neighs = []
 
-            for neighbour in neighbours:
+            for edge in assembly_graph.incident(contig, mode="all"):
+                source, target = edge_list[edge]
                 n = []
-                n.append(neighbour)
-                n.append(1.0)
+                n.append(target if source == contig else source)
+                n.append(edge_weights[edge])
                 neighs.append(n)
 
             line.append(neighs)
 
             data.append(line)
 
-    # Check if initial binning result consists of contigs belonging to multiple bins
-
-    multiple_bins = False
-
-    for item in data:
-        if type(item[1]) is int and type(item[2]) is int:
-            multiple_bins = True
-            break
-
-    if multiple_bins:
-        logger.error(
-            "Initial binning result consists of contigs belonging to multiple bins. Please make sure that each contig in the initial binning result belongs to only one bin."
-        )
-        logger.info("Exiting GraphBin... Bye...!")
-        sys.exit(1)
-
     # Label propagation
 
-    lp = LabelProp()
+    lp = LabelProp(f_storage, f_top_k)
 
     lp.load_data_from_mem(data)
 
@@ -263,64 +351,93 @@ def graphbin_main(
         + str(max_iteration)
     )
 
-    ans = lp.run(diff_threshold, max_iteration, show_log=True, clean_result=False)
+    if components:
+        logger.info(
+            "Running label propagation on each connected component using "
+            + str(nthreads)
+            + " processes"
+        )
+        try:
+            ans = lp.run_components(
+                diff_threshold,
+                max_iteration,
+                show_log=True,
+                n_jobs=nthreads,
+                active_set=active_set,
+                active_tol=active_tol,
+                stable_iterations=stable_iterations,
+                return_arrays=True,
+            )
+        except BrokenProcessPool as err:
+            logger.error(f"Unexpected {err}")
+            logger.error(
+                "A label propagation process terminated unexpectedly. Please try again with fewer processes (--nthreads) or without --components."
+            )
+            logger.info("Exiting GraphBin... Bye...!")
+            sys.exit(1)
+    else:
+        ans = lp.run(
+            diff_threshold,
+            max_iteration,
+            show_log=True,
+            clean_result=False,
+            checkpoint_file=checkpoint_file,
+            checkpoint_interval=checkpoint_interval,
+            resume=resume,
+            warm_start_file=warm_start_file,
+            active_set=active_set,
+            active_tol=active_tol,
+            stable_iterations=stable_iterations,
+            return_arrays=True,
+        )
+
+    if convergence_log is not None:
+        lp.write_iteration_stats(convergence_log)
+        logger.info(
+            f"Label propagation convergence log can be found at {convergence_log}"
+        )
 
     logger.info("Obtaining Label Propagation result")
 
-    for l in ans:
-        for i in range(n_bins):
-            if l[1] == i + 1 and l[0] not in bins[i]:
-                bins[i].append(l[0])
+    # Add the newly labelled vertices to their bins (label = bin index + 1),
+    # keeping the order of the label propagation result within each bin
+    vertices, labels, scores = ans
 
-    # Remove labels of ambiguous vertices
-    # -------------------------------------
+    # Score of the label of each vertex (NaN if label propagation skipped it)
+    contig_scores = np.full(node_count, np.nan)
+    contig_scores[vertices] = scores
 
-    logger.info("Determining ambiguous vertices")
+    binned = vertex_labels > 0
 
-    remove_by_bin = {}
+    new_labelled = ~binned[vertices]
+    vertices = vertices[new_labelled]
+    labels = labels[new_labelled]
 
-    remove_labels = []
+    order = np.argsort(labels, kind="stable")
+    vertices = vertices[order]
+    labels = labels[order]
 
-    for b in range(n_bins):
-        for i in bins[b]:
-            my_bin = b
+    bin_starts = np.searchsorted(labels, np.arange(1, n_bins + 2))
+    for i in range(n_bins):
+        bins[i] = np.concatenate((bins[i], vertices[bin_starts[i] : bin_starts[i + 1]]))
 
-            closest_neighbours = assembly_graph.neighbors(i, mode="all")
+    # Remove labels of ambiguous vertices
+    # -------------------------------------
 
-            # Determine whether all the closest labelled vertices have the same label as its own
-            neighbours_have_same_label = True
-
-            for neighbour in closest_neighbours:
-                for k in range(n_bins):
-                    if neighbour in bins[k]:
-                        if k != my_bin:
-                            neighbours_have_same_label = False
-                            break
-
-            if not neighbours_have_same_label:
-                if my_bin in remove_by_bin:
-                    if len(bins[my_bin]) - len(remove_by_bin[my_bin]) >= MIN_BIN_COUNT:
-                        remove_labels.append(i)
-                        remove_by_bin[my_bin].append(i)
-                else:
-                    if len(bins[my_bin]) >= MIN_BIN_COUNT:
-                        remove_labels.append(i)
-                        remove_by_bin[my_bin] = [i]
+    logger.info("Determining ambiguous vertices")
 
     logger.info("Removing labels of ambiguous vertices")
 
-    # Remove labels of ambiguous vertices
-    for i in remove_labels:
-        for n in range(n_bins):
-            if i in bins[n]:
-                bins[n].remove(i)
+    removed = remove_ambiguous_labels(
+        edges, bins, node_count, min_bin_count, bin_removal
+    )
 
     logger.info("Obtaining the Final Refined Binning result")
 
     final_bins = {}
 
     for i in range(n_bins):
-        for contig in bins[i]:
+        for contig in bins[i].tolist():
             final_bins[contig] = bins_list[i]
 
-    return final_bins, remove_labels, non_isolated
+    return final_bins, removed, is_non_isolated, initial_bins, contig_scores
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""graphbin_extract.py: Write the .fasta files of refined bins from a GraphBin result.
+
+GraphBin can write only the binning result table (--table_only) to skip writing
+the .fasta files of all bins. graphbin_extract.py writes the .fasta files of
+chosen bins later from the binning result table and the contigs file.
+"""
+
+import csv
+import logging
+import sys
+
+from graphbin.parsers.bin_fasta import write_bins
+from graphbin.parsers.fasta_index import FastaIndex
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Anuradha Wickramarachchi", "Yu Lin"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Production"
+
+
+logger = logging.getLogger(f"GraphBin {__version__}")
+
+
+def read_binning_result(binning_file, delimiter):
+    # Bin of each contig in a binning result table
+    contig_bins = {}
+
+    with open(binning_file) as csvfile:
+        readCSV = csv.reader(csvfile, delimiter=delimiter)
+        for row in readCSV:
+            contig_bins[row[0]] = row[1]
+
+    return contig_bins
+
+
+def extract_bins(
+    contigs_file,
+    contig_bins,
+    output_bins_path,
+    prefix,
+    bin_names,
+    bin_layout="files",
+    compress_bins=False,
+    stats_file=None,
+):
+    # Write the contigs of the given bins like write_output. Contigs are named
+    # in the table by their full label or by its first word
+    contigs_index = FastaIndex(contigs_file)
+
+    # Records of the contigs of each bin, in the order of the contigs file
+    bin_records = {bin_name: [] for bin_name in bin_names}
+
+    for record, label in enumerate(contigs_index.labels):
+        name = label.split()[0] if label else label
+        bin_name = contig_bins.get(label, contig_bins.get(name))
+
+        if bin_name in bin_records:
+            bin_records[bin_name].append((record, name))
+
+    write_bins(
+        contigs_index,
+        bin_records,
+        output_bins_path,
+        prefix,
+        bin_layout,
+        compress_bins,
+        stats_file,
+    )
+
+    contigs_index.close()
+
+    return sum(len(records) for records in bin_records.values())
+
+
+def run(args):
+    contigs_file = args.contigs
+    binning_file = args.binned
+    output_path = args.output
+    prefix = args.prefix
+    delimiter = args.delimiter
+    bins = args.bins
+    bin_layout = args.bin_layout.lower()
+    compress_bins = args.compress_bins
+
+    logger.info("Input arguments:")
+    logger.info(f"Contigs file: {contigs_file}")
+    logger.info(f"GraphBin binning result file: {binning_file}")
+    logger.info(f"Final binning output file: {output_path}")
+
+    try:
+        contig_bins = read_binning_result(binning_file, delimiter)
+    except BaseException as err:
+        logger.error(f"Unexpected {err}")
+        logger.error(
+            "Please make sure that the correct path to the binning result file is provided and the delimiter is correct."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    available_bins = sorted(set(contig_bins.values()))
+
+    # Extract all bins if no bins are chosen
+    if len(bins) == 0:
+        bin_names = available_bins
+    else:
+        bin_names = list(dict.fromkeys(bins))
+
+        missing_bins = [
+            bin_name for bin_name in bin_names if bin_name not in available_bins
+        ]
+
+        if len(missing_bins) > 0:
+            logger.error(
+                f"Bins {', '.join(missing_bins)} are not in the binning result. Please choose bins from {', '.join(available_bins)}."
+            )
+            logger.info("Exiting GraphBin... Bye...!")
+            sys.exit(1)
+
+    logger.info(f"Extracting {len(bin_names)} bins")
+
+    output_bins_path = f"{output_path}{prefix}bins/"
+
+    # Kept apart from graphbin_bin_stats.tsv of the GraphBin run, which covers
+    # all bins
+    output_stats_file = f"{output_path}{prefix}graphbin_extract_bin_stats.tsv"
+
+    n_contigs = extract_bins(
+        contigs_file,
+        contig_bins,
+        output_bins_path,
+        prefix,
+        bin_names,
+        bin_layout,
+        compress_bins,
+        output_stats_file,
+    )
+
+    logger.info(f"Number of contigs written: {n_contigs}")
+    logger.info(f"Final binning results can be found in {output_bins_path}")
+
+
+def main(args):
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,17 @@
 This code has been modified from the source found at https://github.com/ZwEin27/python-labelpropagation
 """
 
+import csv
 import logging
+import os
+import sys
+import time
+import zipfile
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 
 __author__ = "Vijini Mallawaarachchi"
@@ -19,6 +29,19 @@ __status__ = "Production"
 # create logger
 logger = logging.getLogger(f"GraphBin {__version__}")
 
+# minimum number of vertices sent to a worker process at once when
+# propagating labels per connected component
+COMPONENT_BATCH_SIZE = 1000
+
+# storage formats of the F matrix
+#   dense:   a list of floats (float64) per vertex
+#   float32: an array of float32 values per vertex
+#   sparse:  a dict of the top-k {label index: value} per vertex
+F_STORAGE_TYPES = ["dense", "float32", "sparse"]
+
+# errors raised when a checkpoint file cannot be read or does not match the data
+CHECKPOINT_ERRORS = (OSError, EOFError, zipfile.BadZipFile, ValueError, KeyError)
+
 
 class Edge:
     def __init__(self, src, dest, weight):
@@ -28,9 +51,13 @@ class Edge:
 
 
 class LabelProp:
-    def __init__(self):
+    def __init__(self, f_storage="dense", f_top_k=10):
         self.logger = logging.getLogger(f"GraphBin {__version__}")
         self.logger.info("Creating an instance of LabelProp")
+        if f_storage not in F_STORAGE_TYPES:
+            raise ValueError("Unknown F storage type " + str(f_storage))
+        self.f_storage = f_storage
+        self.f_top_k = f_top_k
         self.initialize_env()
 
     ################################################################################
@@ -43,12 +70,18 @@ class LabelProp:
         self.vertex_deg_map = {}  # int, float
         self.vertex_label_map = {}  # int, int
         self.label_index_map = {}  # int, int
-        self.vertex_f_map = {}  # int, [float]
+        self.vertex_f_map = {}  # int, [float] | array | {int: float}
         self.vertex_size = 0
         self.label_size = 0
         self.labelled_size = 0
-
-    def setup_env(self):
+        self.frontier_sizes = []
+        self.iteration_stats = []
+        self.max_change = 0.0
+        self.label_changes = 0
+        self.n_iterations = 0
+        self.diff = 0.0
+
+    def setup_env(self, labels=None):
         # initialize vertex_in_adj_map
         for vertex_id in self.vertex_adj_map.keys():
             if vertex_id not in self.vertex_in_adj_map:
@@ -70,8 +103,9 @@ class LabelProp:
 
         # setup vertex_f_map
         v_set = self.vertex_label_map.keys()
-        l_set = self.vertex_label_map.values()
-        l_set = list(set(l_set))
+        if labels is None:
+            labels = self.vertex_label_map.values()
+        l_set = list(set(labels))
         l_set.sort()
 
         label_enum = 0
@@ -99,14 +133,50 @@ class LabelProp:
                         arr.append(1.0)
                     else:
                         arr.append(0.0)
-            self.vertex_f_map.setdefault(v, arr)
-
-    def load_data_from_mem(self, data):
+            self.vertex_f_map.setdefault(v, self.to_f_storage(arr))
+
+    def to_f_storage(self, arr):
+        # convert a dense list of F values to the configured storage
+        if self.f_storage == "float32":
+            return array("f", arr)
+        if self.f_storage == "sparse":
+            return self.top_k({i: f_val for i, f_val in enumerate(arr) if f_val})
+        return arr
+
+    def get_f_values(self, vertex_id):
+        # F values of vertex_id as an indexable sequence of all labels
+        arr = self.vertex_f_map[vertex_id]
+        if self.f_storage == "sparse":
+            return [arr.get(i, 0.0) for i in range(self.label_size)]
+        return arr
+
+    def get_label_index(self, arr):
+        # index of the label with the highest F value (as picked by debug),
+        # or -1 if no label has reached the vertex yet
+        max_f_val = 0.0
+        max_f_val_idx = -1
+        items = arr.items() if self.f_storage == "sparse" else enumerate(arr)
+        for i, f_val in items:
+            if f_val > max_f_val or (f_val == max_f_val > 0.0 and i < max_f_val_idx):
+                max_f_val = f_val
+                max_f_val_idx = i
+        return max_f_val_idx
+
+    def top_k(self, f_map):
+        # keep the f_top_k largest label weights of a sparse F vector
+        if len(f_map) <= self.f_top_k:
+            return f_map
+        top = sorted(f_map.items(), key=lambda x: (-x[1], x[0]))[: self.f_top_k]
+        return dict(sorted(top))
+
+    def load_data_from_mem(self, data, labels=None):
+        # labels fixes the set of class labels (and their order in F)
+        # instead of taking it from the labelled vertices in data
         self.initialize_env()
         self.vertex_size = len(data)
         for line in data:
             self.process_data_line(line)
-        self.setup_env()
+        self.setup_env(labels)
 
     def process_data_line(self, line):
         # [vertexId, vertexLabel, [edges]]
@@ -134,7 +204,7 @@ class LabelProp:
             labels.insert(int(self.label_index_map[label]), label)
         ans = []
         for vertex_id in self.vertex_f_map.keys():
-            arr = self.vertex_f_map[vertex_id]
+            arr = self.get_f_values(vertex_id)
             max_f_val = 0.0
             max_f_val_idx = 0
 
@@ -151,33 +221,86 @@ class LabelProp:
 
         return ans
 
-    def iterate(self):
+    def get_result(self):
+        # arrays of the vertex ids, their labels (highest F value, as picked by
+        # debug) and the F value of that label, in the order of vertex_f_map
+        labels = np.zeros(max(self.label_size, 1), dtype=np.int64)
+        for label, ix in self.label_index_map.items():
+            labels[ix] = label
+
+        vertex_count = len(self.vertex_f_map)
+        vertices = np.fromiter(self.vertex_f_map.keys(), np.int64, vertex_count)
+        label_ix = np.zeros(vertex_count, dtype=np.int64)
+        scores = np.zeros(vertex_count, dtype=np.float64)
+        for k, arr in enumerate(self.vertex_f_map.values()):
+            ix = self.get_label_index(arr)
+            if ix >= 0:
+                label_ix[k] = ix
+                scores[k] = arr[ix]
+
+        return vertices, labels[label_ix], scores
+
+    def compute_f(self, vertex_id):
+        # F(vertex_id) from the F values of its in-neighbours,
+        # along with its absolute change
+        f_values = self.vertex_f_map[vertex_id]
+        deg = self.vertex_deg_map[vertex_id]
+
+        if self.f_storage == "sparse":
+            next_f_value = {}  # int, double
+            for edge in self.vertex_in_adj_map[vertex_id]:
+                weight = edge.weight / deg
+                for i, f_val in self.vertex_f_map[edge.src].items():
+                    next_f_value[i] = next_f_value.get(i, 0.0) + f_val * weight
+            next_f_value = self.top_k(next_f_value)
+
+            vertex_diff = 0.0
+            for i, f_value in next_f_value.items():
+                vertex_diff += abs(f_value - f_values.get(i, 0.0))
+            for i, f_val in f_values.items():
+                if i not in next_f_value:
+                    vertex_diff += f_val
+            return next_f_value, vertex_diff
+
+        next_f_value = [0.0] * self.label_size  # double
+        for edge in self.vertex_in_adj_map[vertex_id]:
+            src_f_values = self.vertex_f_map[edge.src]
+            weight = edge.weight / deg
+            for i in range(self.label_size):
+                next_f_value[i] += src_f_values[i] * weight
+
+        vertex_diff = 0.0
+        for i in range(self.label_size):
+            if next_f_value[i] > f_values[i]:
+                vertex_diff += next_f_value[i] - f_values[i]
+            else:
+                vertex_diff += f_values[i] - next_f_value[i]
+
+        if self.f_storage == "float32":
+            next_f_value = array("f", next_f_value)
+        return next_f_value, vertex_diff
+
+    def iterate(self, tol=None):
+        # with tol, also return the vertices whose in-neighbours changed by
+        # more than tol, which seed the frontier of iterate_active
         next_vertex_f_map = {}  # int, [double]
+        next_frontier = {}  # int, None (insertion ordered set)
         diff = 0
+        self.max_change = 0.0
+        self.label_changes = 0
 
         for vertex_id in self.vertex_f_map.keys():
             if self.vertex_label_map[vertex_id]:  # skip labelled
                 continue
 
             # update F(vertex_id) .. vertex_f_map
-            next_f_value = []  # double
-            f_values = self.vertex_f_map[vertex_id]
+            next_f_value, vertex_diff = self.compute_f(vertex_id)
+            self.track_change(vertex_id, next_f_value, vertex_diff)
+            next_vertex_f_map[vertex_id] = next_f_value
+            diff += vertex_diff
 
-            for i in range(self.label_size):
-                f_value = 0.0
-
-                for edge in self.vertex_in_adj_map[vertex_id]:
-                    weight = edge.weight
-                    src = edge.src
-                    deg = self.vertex_deg_map[vertex_id]
-                    f_value += self.vertex_f_map[src][i] * (weight / deg)
-                next_f_value.append(f_value)
-                if self.vertex_label_map[vertex_id] == 0:
-                    if f_value > f_values[i]:
-                        diff += f_value - f_values[i]
-                    else:
-                        diff += f_values[i] - f_value
-                next_vertex_f_map[vertex_id] = next_f_value
+            if tol is not None and vertex_diff > tol:
+                self.add_to_frontier(vertex_id, next_frontier)
 
         for vertex_id in self.vertex_label_map.keys():
             if self.vertex_label_map[vertex_id] == 0:
@@ -186,19 +309,164 @@ class LabelProp:
 
         self.vertex_f_map = next_vertex_f_map
 
+        if tol is not None:
+            return diff, next_frontier
         return diff
 
-    def run(self, eps, max_iter, show_log=False, clean_result=False):
+    def iterate_active(self, frontier, tol):
+        # recompute only the vertices in frontier and update F in place,
+        # returning the vertices whose in-neighbours changed by more than tol
+        updates = {}  # int, [double]
+        next_frontier = {}  # int, None (insertion ordered set)
+        diff = 0
+        self.max_change = 0.0
+        self.label_changes = 0
+
+        for vertex_id in frontier:
+            next_f_value, vertex_diff = self.compute_f(vertex_id)
+            self.track_change(vertex_id, next_f_value, vertex_diff)
+            updates[vertex_id] = next_f_value
+            diff += vertex_diff
+
+            if vertex_diff > tol:
+                self.add_to_frontier(vertex_id, next_frontier)
+
+        self.vertex_f_map.update(updates)
+
+        return diff, next_frontier
+
+    def add_to_frontier(self, vertex_id, frontier):
+        # unlabelled out-neighbours of a changed vertex are recomputed next
+        for edge in self.vertex_adj_map[vertex_id]:
+            if not self.vertex_label_map[edge.dest]:
+                frontier[edge.dest] = None
+
+    def track_change(self, vertex_id, next_f_value, vertex_diff):
+        # convergence diagnostics of the current iteration
+        if vertex_diff > self.max_change:
+            self.max_change = vertex_diff
+        if self.get_label_index(next_f_value) != self.get_label_index(
+            self.vertex_f_map[vertex_id]
+        ):
+            self.label_changes += 1
+
+    def run(
+        self,
+        eps,
+        max_iter,
+        show_log=False,
+        clean_result=False,
+        checkpoint_file=None,
+        checkpoint_interval=10,
+        resume=False,
+        warm_start_file=None,
+        active_set=False,
+        active_tol=1e-6,
+        stable_iterations=None,
+        return_arrays=False,
+    ):
         diff = 0.0
-        for i in range(max_iter):
-            logger.debug("Iteration " + str(i + 1))
-            diff = self.iterate()
-            if diff < eps:
-                break
+        start_iter = 0
+        converged = False
+
+        try:
+            if (
+                resume
+                and checkpoint_file is not None
+                and os.path.isfile(checkpoint_file)
+            ):
+                start_iter, diff = self.load_checkpoint(checkpoint_file)
+                logger.info(
+                    "Resuming label propagation from iteration "
+                    + str(start_iter)
+                    + " of checkpoint "
+                    + checkpoint_file
+                )
+                converged = diff < eps
+            elif warm_start_file is not None:
+                self.warm_start(warm_start_file)
+                logger.info("Seeded label propagation from " + warm_start_file)
+        except CHECKPOINT_ERRORS as err:
+            logger.error(f"Unexpected {err}")
+            logger.error(
+                "Please make sure that the checkpoint file was created by GraphBin from the same inputs."
+            )
+            logger.info("Exiting GraphBin... Bye...!")
+            sys.exit(1)
+
+        # with active_set, the first iteration is a full pass over all unlabelled
+        # vertices and later ones only recompute the frontier of changed vertices
+        frontier = None
+        self.frontier_sizes = []
+        self.iteration_stats = []
+
+        # with stable_iterations, also stop once no vertex changed its label
+        # for that many consecutive iterations
+        stable = 0
+
+        i = start_iter - 1
+        if not converged:
+            for i in range(start_iter, max_iter):
+                logger.debug("Iteration " + str(i + 1))
+                start_time = time.time()
+                if active_set and frontier is not None:
+                    n_computed = len(frontier)
+                    diff, frontier = self.iterate_active(frontier, active_tol)
+                elif active_set:
+                    n_computed = self.vertex_size - self.labelled_size
+                    diff, frontier = self.iterate(active_tol)
+                else:
+                    n_computed = self.vertex_size - self.labelled_size
+                    diff = self.iterate()
+                if active_set:
+                    self.frontier_sizes.append(n_computed)
+
+                self.iteration_stats.append(
+                    {
+                        "iteration": i + 1,
+                        "diff": diff,
+                        "max_change": self.max_change,
+                        "label_changes": self.label_changes,
+                        "computed": n_computed,
+                        "time": time.time() - start_time,
+                    }
+                )
+                logger.debug(
+                    "diff = "
+                    + str(diff)
+                    + ", max change = "
+                    + str(self.max_change)
+                    + ", label changes = "
+                    + str(self.label_changes)
+                    + ", computed vertices = "
+                    + str(n_computed)
+                )
+
+                if self.label_changes == 0:
+                    stable += 1
+                else:
+                    stable = 0
+
+                if diff < eps or (active_set and len(frontier) == 0):
+                    break
+                if stable_iterations and stable >= stable_iterations:
+                    logger.debug("Labels unchanged for " + str(stable) + " iterations")
+                    break
+                if checkpoint_file is not None and (i + 1) % checkpoint_interval == 0:
+                    self.save_checkpoint(checkpoint_file, i + 1, diff)
+
+        if checkpoint_file is not None:
+            self.save_checkpoint(checkpoint_file, i + 1, diff)
+
+        self.n_iterations = i + 1
+        self.diff = diff
 
         if show_log:
             self.show_detail(diff, eps, i, max_iter)
 
+        if return_arrays:
+            return self.get_result()
+
         ans = self.debug()
 
         if clean_result:
@@ -213,6 +481,306 @@ class LabelProp:
             ans = rtn_cleaned
         return ans
 
+    def write_iteration_stats(self, stats_file, delimiter="\t"):
+        # write the convergence diagnostics of the last run
+        with open(stats_file, mode="w") as out_file:
+            output_writer = csv.writer(out_file, delimiter=delimiter)
+            output_writer.writerow(
+                ["iteration", "diff", "max_change", "label_changes", "computed", "time"]
+            )
+            for stats in self.iteration_stats:
+                output_writer.writerow(
+                    [
+                        stats["iteration"],
+                        stats["diff"],
+                        stats["max_change"],
+                        stats["label_changes"],
+                        stats["computed"],
+                        stats["time"],
+                    ]
+                )
+
+    ################################################################################
+    #   Label Propagation by Connected Component
+    ################################################################################
+
+    def get_components(self):
+        # connected components of the loaded graph, each as a list of vertices
+        # in load order
+        component_of = {}
+        n_components = 0
+        for vertex_id in self.vertex_adj_map.keys():
+            if vertex_id in component_of:
+                continue
+            component_of[vertex_id] = n_components
+            stack = [vertex_id]
+            while stack:
+                v = stack.pop()
+                for edge in self.vertex_adj_map[v]:
+                    if edge.dest not in component_of:
+                        component_of[edge.dest] = n_components
+                        stack.append(edge.dest)
+            n_components += 1
+
+        components = [[] for x in range(n_components)]
+        for vertex_id in self.vertex_adj_map.keys():
+            components[component_of[vertex_id]].append(vertex_id)
+        return components
+
+    def run_components(
+        self,
+        eps,
+        max_iter,
+        show_log=False,
+        n_jobs=1,
+        active_set=False,
+        active_tol=1e-6,
+        stable_iterations=None,
+        return_arrays=False,
+    ):
+        # labels never cross connected components, so each component is an
+        # independent problem with its own convergence check
+        components = self.get_components()
+        components.sort(key=len, reverse=True)
+        labels = list(self.label_index_map.keys())
+
+        # large components are propagated on their own while small ones are
+        # batched together to keep the overhead of worker processes low
+        batches = []
+        batch = []
+        batch_size = 0
+        for component in components:
+            batch.append(
+                [
+                    [
+                        v,
+                        self.vertex_label_map[v],
+                        [[e.dest, e.weight] for e in self.vertex_adj_map[v]],
+                    ]
+                    for v in component
+                ]
+            )
+            batch_size += len(component)
+            if batch_size >= COMPONENT_BATCH_SIZE:
+                batches.append(batch)
+                batch = []
+                batch_size = 0
+        if batch:
+            batches.append(batch)
+
+        args = (
+            labels,
+            eps,
+            max_iter,
+            active_set,
+            active_tol,
+            stable_iterations,
+            return_arrays,
+            self.f_storage,
+            self.f_top_k,
+        )
+        results = []
+        if n_jobs > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [
+                    executor.submit(propagate_components, batch, *args)
+                    for batch in batches
+                ]
+                for future in futures:
+                    results.extend(future.result())
+        else:
+            for batch in batches:
+                results.extend(propagate_components(batch, *args))
+
+        # assemble the result in the same order as a single LabelProp.run
+        # and sum up the convergence diagnostics of the components by iteration
+        vertex_ans = {}
+        max_iter_done = 0
+        diff = 0.0
+        self.iteration_stats = []
+        for ans, n_iter, component_diff, iteration_stats in results:
+            if return_arrays:
+                for vertex_id, label, score in zip(*ans):
+                    vertex_ans[vertex_id] = (label, score)
+            else:
+                for line in ans:
+                    vertex_ans[line[0]] = line
+            max_iter_done = max(max_iter_done, n_iter)
+            diff += component_diff
+            for stats in iteration_stats:
+                ix = stats["iteration"] - 1
+                if ix == len(self.iteration_stats):
+                    self.iteration_stats.append(dict(stats))
+                    continue
+                total = self.iteration_stats[ix]
+                total["diff"] += stats["diff"]
+                total["max_change"] = max(total["max_change"], stats["max_change"])
+                total["label_changes"] += stats["label_changes"]
+                total["computed"] += stats["computed"]
+                total["time"] += stats["time"]
+
+        if show_log:
+            logger.info("Number of connected components:\t" + str(len(components)))
+            if len(components) > 0:
+                logger.info("Largest connected component:\t" + str(len(components[0])))
+            self.show_detail(diff, eps, max_iter_done - 1, max_iter)
+
+        vertices = [v for v in self.vertex_f_map if not self.vertex_label_map[v]]
+        vertices += [v for v in self.vertex_f_map if self.vertex_label_map[v]]
+
+        if return_arrays:
+            return (
+                np.array(vertices, dtype=np.int64),
+                np.fromiter((vertex_ans[v][0] for v in vertices), np.int64),
+                np.fromiter((vertex_ans[v][1] for v in vertices), np.float64),
+            )
+
+        return [vertex_ans[v] for v in vertices]
+
+    ################################################################################
+    #   Checkpointing
+    ################################################################################
+
+    def save_checkpoint(self, checkpoint_file, iteration, diff):
+        # write to a temporary file first so that an interrupted write
+        # never clobbers the previous checkpoint. The state is saved as plain
+        # NumPy arrays so that reading a checkpoint never runs any code
+        labels = [None] * self.label_size
+        for l, ix in self.label_index_map.items():
+            labels[ix] = l
+        vertices = list(self.vertex_f_map.keys())
+
+        state = {
+            "iteration": iteration,
+            "diff": diff,
+            "f_storage": self.f_storage,
+            "labels": np.array(labels),
+            "vertices": np.array(vertices, dtype=np.int64),
+        }
+
+        if self.f_storage == "sparse":
+            # F rows as a CSR matrix of label indices and values
+            rows = [self.vertex_f_map[v] for v in vertices]
+            state["f_offsets"] = np.cumsum([0] + [len(arr) for arr in rows])
+            state["f_indices"] = np.fromiter(
+                (i for arr in rows for i in arr.keys()), np.int64
+            )
+            state["f_values"] = np.fromiter(
+                (f_val for arr in rows for f_val in arr.values()), np.float64
+            )
+        else:
+            state["f_values"] = np.array(
+                [self.vertex_f_map[v] for v in vertices],
+                dtype=np.float32 if self.f_storage == "float32" else np.float64,
+            ).reshape(len(vertices), self.label_size)
+
+        tmp_file = checkpoint_file + ".tmp"
+        with open(tmp_file, "wb") as file:
+            np.savez(file, **state)
+        os.replace(tmp_file, checkpoint_file)
+        logger.debug("Saved checkpoint at iteration " + str(iteration))
+
+    def read_checkpoint(self, checkpoint_file):
+        checkpoint = np.load(checkpoint_file, allow_pickle=False)
+        if not isinstance(checkpoint, np.lib.npyio.NpzFile):
+            raise ValueError(checkpoint_file + " is not a label propagation checkpoint")
+        with checkpoint:
+            state = {key: checkpoint[key] for key in checkpoint.files}
+
+        labels = state["labels"].tolist()
+        vertices = state["vertices"].tolist()
+        f_storage = str(state["f_storage"])
+
+        # F rows are returned in the storage they were saved in, as dicts of
+        # {label index: value} for sparse storage and as lists otherwise
+        if f_storage == "sparse":
+            offsets = state["f_offsets"].tolist()
+            indices = state["f_indices"].tolist()
+            values = state["f_values"].tolist()
+            rows = [
+                dict(
+                    zip(
+                        indices[offsets[k] : offsets[k + 1]],
+                        values[offsets[k] : offsets[k + 1]],
+                    )
+                )
+                for k in range(len(vertices))
+            ]
+        else:
+            rows = state["f_values"].tolist()
+
+        return {
+            "iteration": int(state["iteration"]),
+            "diff": float(state["diff"]),
+            "f_storage": f_storage,
+            "label_index_map": {l: ix for ix, l in enumerate(labels)},
+            "vertex_f_map": dict(zip(vertices, rows)),
+        }
+
+    def load_checkpoint(self, checkpoint_file):
+        # restore F and the iteration count of an interrupted run on the same data
+        state = self.read_checkpoint(checkpoint_file)
+        if state["label_index_map"] != self.label_index_map or set(
+            state["vertex_f_map"].keys()
+        ) != set(self.vertex_f_map.keys()):
+            raise ValueError(
+                checkpoint_file
+                + " was created from a different graph or binning result"
+            )
+        for vertex_id, arr in state["vertex_f_map"].items():
+            self.vertex_f_map[vertex_id] = self.from_checkpoint_row(arr)
+        return state["iteration"], state["diff"]
+
+    def from_checkpoint_row(self, arr):
+        # F row of a checkpoint in the configured storage. Sparse rows are only
+        # expanded to all labels when the run does not use sparse storage
+        if isinstance(arr, dict):
+            if self.f_storage == "sparse":
+                return self.top_k(arr)
+            arr = [arr.get(i, 0.0) for i in range(self.label_size)]
+        return self.to_f_storage(list(arr))
+
+    def warm_start(self, checkpoint_file):
+        # seed F of unlabelled vertices from the result of a previous run,
+        # matching labels by value since label indices may differ between runs
+        state = self.read_checkpoint(checkpoint_file)
+
+        # label index of this run of each label index of the checkpoint
+        index_map = {
+            prev_ix: self.label_index_map[l]
+            for l, prev_ix in state["label_index_map"].items()
+            if l in self.label_index_map
+        }
+        mapped = set(index_map.values())
+
+        for vertex_id, prev_arr in state["vertex_f_map"].items():
+            if vertex_id not in self.vertex_f_map or self.vertex_label_map[vertex_id]:
+                continue
+
+            if isinstance(prev_arr, dict) and self.f_storage == "sparse":
+                # F values of labels in the checkpoint are replaced by its values
+                arr = {
+                    i: f_val
+                    for i, f_val in self.vertex_f_map[vertex_id].items()
+                    if i not in mapped
+                }
+                for prev_ix, f_val in prev_arr.items():
+                    if prev_ix in index_map and f_val:
+                        arr[index_map[prev_ix]] = f_val
+                self.vertex_f_map[vertex_id] = self.top_k(dict(sorted(arr.items())))
+                continue
+
+            if isinstance(prev_arr, dict):
+                prev_arr = [
+                    prev_arr.get(i, 0.0) for i in range(len(state["label_index_map"]))
+                ]
+
+            arr = list(self.get_f_values(vertex_id))
+            for prev_ix, f_val in enumerate(prev_arr):
+                if prev_ix in index_map:
+                    arr[index_map[prev_ix]] = f_val
+            self.vertex_f_map[vertex_id] = self.to_f_storage(arr)
+
     ################################################################################
     #   Show Info.
     ################################################################################
@@ -227,9 +795,51 @@ class LabelProp:
         logger.info("Previous numebr of labeled vertices:\t" + str(self.labelled_size))
         logger.info("Value of eps parameter:\t\t" + str(eps))
         logger.info("Value of max_iteration parameter:\t" + str(max_iter))
+        if self.frontier_sizes:
+            logger.info(
+                "Frontier sizes:\t\t\t" + ",".join(str(n) for n in self.frontier_sizes)
+            )
         logger.info("Final values:")
         logger.info("iter = " + str(i + 1) + ", diff = " + str(diff))
 
     def show_vertex_adj(self):
         for k, v in self.vertex_adj_map.items():
             logger.debug(str([4, [[_.src, _.dest, _.weight] for _ in v]]))
+
+
+def propagate_components(
+    components,
+    labels,
+    eps,
+    max_iter,
+    active_set,
+    active_tol,
+    stable_iterations,
+    return_arrays,
+    f_storage,
+    f_top_k,
+):
+    # run label propagation on each component in components (a list of data
+    # lists) and return the result, iteration count, final diff and
+    # convergence diagnostics of each
+
+    # logging every component would flood the log, so keep quiet meanwhile
+    disabled = logger.disabled
+    logger.disabled = True
+    try:
+        results = []
+        for data in components:
+            lp = LabelProp(f_storage, f_top_k)
+            lp.load_data_from_mem(data, labels)
+            ans = lp.run(
+                eps,
+                max_iter,
+                active_set=active_set,
+                active_tol=active_tol,
+                stable_iterations=stable_iterations,
+                return_arrays=return_arrays,
+            )
+            results.append((ans, lp.n_iterations, lp.diff, lp.iteration_stats))
+    finally:
+        logger.disabled = disabled
+    return results
@@ -5,6 +5,10 @@ import logging
 import re
 import sys
 
+from array import array
+
+import numpy as np
+
 
 __author__ = "Vijini Mallawaarachchi"
 __copyright__ = "Copyright 2019-2022, GraphBin Project"
@@ -19,31 +23,187 @@ __status__ = "Production"
 logger = logging.getLogger(f"GraphBin {__version__}")
 
 
-def get_initial_bin_count(contig_bins_file, delimiter):
-    n_bins = 0
+def read_initial_binning(contig_bins_file, delimiter, node_count, get_contig_num):
+    logger.info("Obtaining the initial binning result")
 
-    try:
-        all_bins_list = []
+    # Bin and first row of each contig (-1 if not binned), with bin names
+    # numbered as they appear
+    contig_bins = np.full(node_count, -1, dtype=np.int32)
+    contig_rows = np.full(node_count, -1, dtype=np.int64)
+    bin_numbers = {}
+    multiple_bins = False
 
-        with open(contig_bins_file) as csvfile:
-            readCSV = csv.reader(csvfile, delimiter=delimiter)
-            for row in readCSV:
-                all_bins_list.append(row[1])
+    try:
+        with open(contig_bins_file) as contig_bins_csv:
+            readCSV = csv.reader(contig_bins_csv, delimiter=delimiter)
+            for row_num, row in enumerate(readCSV):
+                contig_num = get_contig_num(row[0])
+                bin_num = bin_numbers.setdefault(row[1], len(bin_numbers))
 
-        bins_list = list(set(all_bins_list))
-        bins_list.sort()
+                if contig_bins[contig_num] == -1:
+                    contig_rows[contig_num] = row_num
+                elif contig_bins[contig_num] != bin_num:
+                    multiple_bins = True
 
-        n_bins = len(bins_list)
-        logger.info(
-            "Number of bins available in the initial binning result: " + str(n_bins)
-        )
+                contig_bins[contig_num] = bin_num
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
         logger.error(
-            "Please make sure that the correct path to the initial binning result file is provided and it is having the correct format."
+            "Please make sure that you have provided the correct assembler type and the correct path to the binning result file in the correct format."
         )
         logger.info("Exiting GraphBin... Bye...!")
         sys.exit(1)
 
-    return n_bins, bins_list
+    if multiple_bins:
+        logger.error(
+            "Initial binning result consists of contigs belonging to multiple bins. Please make sure that each contig in the initial binning result belongs to only one bin."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    # Renumber bins in the sorted order of their names
+    bins_list = sorted(bin_numbers)
+    n_bins = len(bins_list)
+
+    logger.info(
+        "Number of bins available in the initial binning result: " + str(n_bins)
+    )
+
+    bin_ranks = np.empty(n_bins, dtype=np.int32)
+    bin_ranks[[bin_numbers[bin_name] for bin_name in bins_list]] = np.arange(n_bins)
+
+    binned = contig_bins >= 0
+    contig_bins[binned] = bin_ranks[contig_bins[binned]]
+
+    # Index array of the contigs of each bin, in the order of the initial
+    # binning result
+    binned_contigs = np.flatnonzero(binned)
+    binned_contigs = binned_contigs[
+        np.lexsort((contig_rows[binned_contigs], contig_bins[binned_contigs]))
+    ]
+    bin_starts = np.searchsorted(contig_bins[binned_contigs], np.arange(n_bins + 1))
+
+    bins = [binned_contigs[bin_starts[b] : bin_starts[b + 1]] for b in range(n_bins)]
+
+    return n_bins, bins_list, bins
+
+
+def get_segment_contigs_index(path_segments, path_contigs, n_segments, node_count):
+    # CSR index of the contigs whose paths contain each segment. The contigs of
+    # segment s are contig_ids[segment_starts[s] : segment_starts[s + 1]]
+    n_contigs = max(node_count, 1)
+
+    keys = np.unique(
+        np.asarray(path_segments, dtype=np.int64) * n_contigs
+        + np.asarray(path_contigs, dtype=np.int64)
+    )
+
+    segment_starts = np.searchsorted(keys // n_contigs, np.arange(n_segments + 1))
+
+    return segment_starts.tolist(), (keys % n_contigs).tolist()
+
+
+def get_gfa_path(line):
+    # Name and oriented segments (<segment><+/->) of a GFA P or W line
+    strings = line.rstrip("\n").split("\t")
+
+    if strings[0] == "P":
+        return strings[1], strings[2].split(",")
+
+    # W lines have the sequence ID in column 4 and a walk such as >s1<s2>s3
+    return strings[3], [
+        segment + ("+" if orientation == ">" else "-")
+        for orientation, segment in re.findall("([><])([^><]+)", strings[6])
+    ]
+
+
+def get_coverage(contig_name):
+    # coverage encoded in SPAdes/MEGAHIT style contig names (..._cov_<coverage>...)
+    match = re.search("_cov_([0-9.]+)", contig_name)
+    if match is None:
+        return 0.0
+    return float(match.group(1).rstrip("."))
+
+
+def get_overlap_length(cigar):
+    # number of aligned bases in the overlap CIGAR of a GFA link (0 for "*")
+    return sum(int(n) for n, op in re.findall("([0-9]+)([MX=])", cigar))
+
+
+def read_gfa_links(assembly_graph_file):
+    # Names of the segments (S lines) of a .gfa file in the order they are read,
+    # and the source and target vertex IDs and the overlap length of each link
+    # (L line) that is not a self loop. Segment names are numbered as they are
+    # read, as links can appear before the segments they connect
+    segment_names = []
+    name_ids = {}
+    segment_name_ids = array("l")
+
+    link_sources = array("l")
+    link_targets = array("l")
+    overlaps = array("l")
+
+    with open(assembly_graph_file) as file:
+        for line in file:
+            if line.startswith("S"):
+                strings = line.strip().split("\t")
+                segment_names.append(strings[1])
+                segment_name_ids.append(name_ids.setdefault(strings[1], len(name_ids)))
+
+            elif line.startswith("L"):
+                strings = line.strip().split("\t")
+
+                # Remove self loops
+                if strings[1] != strings[3]:
+                    link_sources.append(name_ids.setdefault(strings[1], len(name_ids)))
+                    link_targets.append(name_ids.setdefault(strings[3], len(name_ids)))
+                    overlaps.append(
+                        get_overlap_length(strings[5]) if len(strings) > 5 else 0
+                    )
+
+    if np.bincount(segment_name_ids).max(initial=0) > 1:
+        raise ValueError("segment names are not unique")
+
+    # Vertex ID of each segment name (-1 for names without a segment)
+    vertex_ids = np.full(len(name_ids), -1, dtype=np.int64)
+    vertex_ids[np.array(segment_name_ids, dtype=np.int64)] = np.arange(
+        len(segment_names)
+    )
+
+    edge_sources = vertex_ids[np.array(link_sources, dtype=np.int64)]
+    edge_targets = vertex_ids[np.array(link_targets, dtype=np.int64)]
+
+    if (edge_sources < 0).any() or (edge_targets < 0).any():
+        raise ValueError("links refer to segments that are not in the graph")
+
+    return segment_names, edge_sources, edge_targets, overlaps
+
+
+def write_columnar_output(
+    output_file,
+    contig_names,
+    bins_list,
+    initial_bins,
+    bins,
+    removed,
+    non_isolated,
+    scores,
+):
+    # Write the binning result of every contig as NumPy arrays to one .npz file.
+    # Bins are stored as indices into bin_names (-1 if the contig is not binned)
+    final_bins = np.full(len(contig_names), -1, dtype=np.int64)
+    for b in range(len(bins)):
+        final_bins[bins[b]] = b
+
+    np.savez(
+        output_file,
+        contig_index=np.arange(len(contig_names)),
+        contig_name=np.array(contig_names, dtype=str),
+        bin_names=np.array(bins_list, dtype=str),
+        initial_bin=initial_bins,
+        final_bin=final_bins,
+        removed=removed,
+        unbinned=removed | ~non_isolated,
+        score=scores,
+    )
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import gzip
+import io
+import logging
+import os
+import subprocess
+import zlib
+
+from array import array
+
+from graphbin.parsers.fasta import get_clean_sequence, read_fasta_blocks
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Anuradha Wickramarachchi", "Yu Lin"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Production"
+
+
+logger = logging.getLogger(f"GraphBin {__version__}")
+
+# files writes one .fasta file per bin, single writes all bins to one .fasta file
+# grouped by bin with an index of the bins
+BIN_LAYOUTS = ["files", "single"]
+
+BIN_INDEX_SUFFIX = ".idx"
+
+BIN_INDEX_HEADER = "#bin\toffset\tlength\tcontigs"
+
+BIN_STATS_HEADER = "bin\tcontigs\ttotal_length\tN50\tGC"
+
+
+def get_bins_file(output_bins_path, prefix, compress_bins=False):
+    # Path of the .fasta file with all bins of the single layout
+    return f"{output_bins_path}{prefix}bins.fasta{'.gz' if compress_bins else ''}"
+
+
+def get_n50(lengths):
+    # Length of the shortest contig among the longest contigs that together
+    # cover at least half of the total length
+    total_length = sum(lengths)
+    covered = 0
+
+    for length in sorted(lengths, reverse=True):
+        covered += length
+        if 2 * covered >= total_length:
+            return length
+
+    return 0
+
+
+def write_bins(
+    contigs_index,
+    bin_records,
+    output_bins_path,
+    prefix,
+    bin_layout="files",
+    compress_bins=False,
+    stats_file=None,
+):
+    # Write the contigs of each bin, given as (record, name) pairs of the contigs
+    # index in bin_records. Compressed bins are written as separate gzip members,
+    # so that each bin of the single layout can be decompressed on its own.
+    # Summary statistics of each bin are collected while its contigs are written
+    # and returned (and written to stats_file if given)
+    if not os.path.isdir(output_bins_path):
+        subprocess.run(f"mkdir -p {output_bins_path}", shell=True)
+
+    suffix = ".fasta.gz" if compress_bins else ".fasta"
+
+    if bin_layout == "single":
+        bins_file = get_bins_file(output_bins_path, prefix, compress_bins)
+        out_file = open(bins_file, "wb")
+        bin_index = []
+
+    bin_stats = []
+
+    for bin_name in sorted(bin_records):
+        if bin_layout == "files":
+            out_file = open(f"{output_bins_path}{prefix}bin_{bin_name}{suffix}", "wb")
+
+        start = out_file.tell()
+
+        # wbits=31 writes a gzip header and trailer
+        compressor = zlib.compressobj(wbits=31) if compress_bins else None
+
+        lengths = array("q")
+        gc_count = 0
+        base_count = 0
+
+        for record, name in bin_records[bin_name]:
+            sequence = contigs_index.get_sequence(record)
+
+            data = f">{name}\n{sequence}\n".encode()
+            out_file.write(compressor.compress(data) if compress_bins else data)
+
+            # GC content is computed over the A, C, G and T bases only
+            lengths.append(len(sequence))
+            gc = sum(sequence.count(base) for base in "GCgc")
+            gc_count += gc
+            base_count += gc + sum(sequence.count(base) for base in "ATat")
+
+        if compress_bins:
+            out_file.write(compressor.flush())
+
+        bin_stats.append(
+            (
+                bin_name,
+                len(lengths),
+                sum(lengths),
+                get_n50(lengths),
+                gc_count / base_count if base_count > 0 else 0.0,
+            )
+        )
+
+        if bin_layout == "files":
+            out_file.close()
+        else:
+            bin_index.append(
+                (bin_name, start, out_file.tell() - start, len(bin_records[bin_name]))
+            )
+
+    if bin_layout == "single":
+        out_file.close()
+
+        with open(f"{bins_file}{BIN_INDEX_SUFFIX}", "w") as index_file:
+            index_file.write(f"{BIN_INDEX_HEADER}\n")
+            for bin_name, offset, length, n_contigs in bin_index:
+                index_file.write(f"{bin_name}\t{offset}\t{length}\t{n_contigs}\n")
+
+    if stats_file is not None:
+        with open(stats_file, "w") as file:
+            file.write(f"{BIN_STATS_HEADER}\n")
+            for bin_name, n_contigs, total_length, n50, gc in bin_stats:
+                file.write(
+                    f"{bin_name}\t{n_contigs}\t{total_length}\t{n50}\t{gc:.4f}\n"
+                )
+
+        logger.info(f"Summary statistics of the bins can be found at {stats_file}")
+
+    return bin_stats
+
+
+def read_bin_index(index_file):
+    # Byte offset, byte length and number of contigs of each bin of a bins file
+    bin_index = {}
+
+    with open(index_file) as file:
+        for line in file:
+            if line.startswith("#"):
+                continue
+
+            bin_name, offset, length, n_contigs = line.rstrip("\n").split("\t")
+            bin_index[bin_name] = (int(offset), int(length), int(n_contigs))
+
+    return bin_index
+
+
+def read_bin(bins_file, bin_index, bin_name):
+    # Yield the label and the sequence of each contig of a bin of a bins file
+    offset, length, _ = bin_index[bin_name]
+
+    with open(bins_file, "rb") as file:
+        file.seek(offset)
+        data = file.read(length)
+
+    if data.startswith(b"\x1f\x8b"):
+        data = gzip.decompress(data)
+
+    for label, _, _, sequence in read_fasta_blocks(io.BytesIO(data)):
+        yield label, get_clean_sequence(sequence)
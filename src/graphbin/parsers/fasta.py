@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import gzip
+import re
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Anuradha Wickramarachchi", "Yu Lin"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Production"
+
+
+# Number of bytes read from the FASTA file at a time
+FASTA_BUFFER_SIZE = 4 * 1024 * 1024
+
+FASTA_HEADER = re.compile(rb"^>([^\n]*)(?:\n|\Z)", re.MULTILINE)
+
+WHITESPACE = b" \t\n\r\f\v"
+
+
+def open_fasta(fasta_file):
+    # Open a FASTA file for reading bytes, decompressing it if it is gzipped
+    with open(fasta_file, "rb") as file:
+        compressed = file.read(2) == b"\x1f\x8b"
+
+    if compressed:
+        return gzip.open(fasta_file)
+
+    return open(fasta_file, "rb")
+
+
+def get_clean_sequence(block):
+    # Remove comment lines and whitespace from the sequence lines of a record
+    if b"#" in block:
+        block = b"\n".join(
+            line for line in block.split(b"\n") if not line.startswith(b"#")
+        )
+
+    return block.translate(None, WHITESPACE).decode()
+
+
+def read_fasta_blocks(file, with_sequence=True, buffer_size=FASTA_BUFFER_SIZE):
+    # Yield the label, the byte offset and the byte size of the sequence lines of
+    # each record of an open FASTA file, and the sequence lines if with_sequence.
+    # The file is read in large chunks and only complete lines are scanned for
+    # headers, so that a header is never split between two chunks
+    label = None
+    offset = 0
+    size = 0
+    sequence = bytearray()
+
+    # Byte offset of the start of the buffer
+    position = 0
+    buffer = b""
+    at_line_start = True
+
+    while True:
+        chunk = file.read(buffer_size)
+        buffer = buffer + chunk if buffer else chunk
+
+        end = len(buffer)
+
+        # Keep an incomplete last line for the next chunk if it can be a header
+        if chunk:
+            line_start = buffer.rfind(b"\n") + 1
+            if line_start == 0 and not at_line_start:
+                line_start = end
+            if buffer.startswith(b">", line_start):
+                end = line_start
+
+        last = 0
+
+        for match in FASTA_HEADER.finditer(buffer, 0, end):
+            if match.start() == 0 and not at_line_start:
+                continue
+
+            if label is not None:
+                size += match.start() - last
+                if with_sequence:
+                    sequence += buffer[last : match.start()]
+
+                yield label, offset, size, sequence
+
+            label = match.group(1).decode().strip()
+            offset = position + match.end()
+            size = 0
+            sequence = bytearray()
+            last = match.end()
+
+        if label is not None:
+            size += end - last
+            if with_sequence:
+                sequence += buffer[last:end]
+
+        if end > 0:
+            at_line_start = buffer[end - 1 : end] == b"\n"
+
+        position += end
+        buffer = buffer[end:]
+
+        if not chunk:
+            break
+
+    if label is not None:
+        yield label, offset, size, sequence
+
+
+def read_fasta_headers(fasta_file):
+    # Yield the label of each record
+    with open_fasta(fasta_file) as file:
+        for label, _, _, _ in read_fasta_blocks(file, with_sequence=False):
+            yield label
+
+
+def read_fasta_offsets(fasta_file):
+    # Yield the label and the byte offset and byte size of the sequence lines of
+    # each record. Offsets of gzipped files are offsets in the decompressed data
+    with open_fasta(fasta_file) as file:
+        for label, offset, size, _ in read_fasta_blocks(file, with_sequence=False):
+            yield label, offset, size
+
+
+def read_fasta_records(fasta_file):
+    # Yield the label and the sequence of each record
+    with open_fasta(fasta_file) as file:
+        for label, _, _, sequence in read_fasta_blocks(file):
+            yield label, get_clean_sequence(sequence)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import io
+import logging
+import mmap
+import os
+
+from array import array
+
+from graphbin.parsers.fasta import (
+    get_clean_sequence,
+    open_fasta,
+    read_fasta_blocks,
+)
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Anuradha Wickramarachchi", "Yu Lin"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Production"
+
+
+logger = logging.getLogger(f"GraphBin {__version__}")
+
+FASTA_INDEX_SUFFIX = ".gbi"
+
+FASTA_INDEX_HEADER = "#graphbin fasta index"
+
+
+class FastaIndex:
+    def __init__(self, fasta_file):
+        self.fasta_file = fasta_file
+        self.index_file = f"{fasta_file}{FASTA_INDEX_SUFFIX}"
+
+        # Label, byte offset and byte size of the sequence of each record
+        self.labels = []
+        self.offsets = array("q")
+        self.sizes = array("q")
+
+        self.data = self.open_data()
+
+        if not self.load_index():
+            self.build_index()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def open_data(self):
+        with open_fasta(self.fasta_file) as file:
+            # Compressed files cannot be mapped, so they are decompressed to memory
+            if not isinstance(file, io.BufferedReader):
+                return file.read()
+
+            if os.fstat(file.fileno()).st_size == 0:
+                return b""
+
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get_file_stamp(self):
+        stat = os.stat(self.fasta_file)
+        return f"{stat.st_size}\t{stat.st_mtime_ns}"
+
+    def build_index(self):
+        logger.debug(f"Indexing {self.fasta_file}")
+
+        if isinstance(self.data, mmap.mmap):
+            file = open(self.fasta_file, "rb")
+        else:
+            file = io.BytesIO(self.data)
+
+        with file:
+            for label, offset, size, _ in read_fasta_blocks(file, with_sequence=False):
+                self.labels.append(label)
+                self.offsets.append(offset)
+                self.sizes.append(size)
+
+        if not isinstance(self.data, mmap.mmap):
+            return
+
+        # Cache the index alongside the FASTA file
+        try:
+            with open(self.index_file, "w") as index_file:
+                index_file.write(f"{FASTA_INDEX_HEADER}\t{self.get_file_stamp()}\n")
+                for label, offset, size in zip(self.labels, self.offsets, self.sizes):
+                    index_file.write(f"{offset}\t{size}\t{label}\n")
+        except OSError as err:
+            logger.debug(f"Could not write the index {self.index_file}: {err}")
+
+    def load_index(self):
+        if not isinstance(self.data, mmap.mmap) or not os.path.isfile(self.index_file):
+            return False
+
+        try:
+            with open(self.index_file) as index_file:
+                # Rebuild the index if the FASTA file changed after it was indexed
+                if (
+                    index_file.readline().rstrip("\n")
+                    != f"{FASTA_INDEX_HEADER}\t{self.get_file_stamp()}"
+                ):
+                    return False
+
+                for line in index_file:
+                    offset, size, label = line.rstrip("\n").split("\t", 2)
+                    self.labels.append(label)
+                    self.offsets.append(int(offset))
+                    self.sizes.append(int(size))
+
+        except (OSError, ValueError) as err:
+            logger.debug(f"Could not read the index {self.index_file}: {err}")
+            self.labels = []
+            self.offsets = array("q")
+            self.sizes = array("q")
+            return False
+
+        logger.debug(f"Loaded the index {self.index_file}")
+
+        return True
+
+    def get_sequence(self, record):
+        start = self.offsets[record]
+        return get_clean_sequence(self.data[start : start + self.sizes[record]])
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
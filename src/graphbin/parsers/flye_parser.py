@@ -2,16 +2,24 @@
 
 import csv
 import logging
-import os
-import subprocess
 import sys
 
+from array import array
 from collections import defaultdict
 
-from cogent3.parse.fasta import MinimalFastaParser
+import numpy as np
+
 from igraph import *
 
 from graphbin.bidirectionalmap.bidirectionalmap import BidirectionalMap
+from graphbin.parsers import (
+    get_gfa_path,
+    get_segment_contigs_index,
+    read_initial_binning,
+    write_columnar_output,
+)
+from graphbin.parsers.bin_fasta import write_bins
+from graphbin.parsers.fasta_index import FastaIndex
 
 
 __author__ = "Vijini Mallawaarachchi"
@@ -28,96 +36,148 @@ logger = logging.getLogger(f"GraphBin {__version__}")
 
 
 def get_initial_binning_result(
-    n_bins, bins_list, contig_bins_file, contig_names_rev, delimiter
+    contig_bins_file, contig_names_rev, node_count, delimiter
 ):
-    logger.info("Obtaining the initial binning result")
+    def get_contig_num(contig_name):
+        return contig_names_rev[contig_name]
 
-    bins = [[] for x in range(n_bins)]
+    return read_initial_binning(contig_bins_file, delimiter, node_count, get_contig_num)
 
-    try:
-        with open(contig_bins_file) as contig_bins:
-            readCSV = csv.reader(contig_bins, delimiter=delimiter)
-            for row in readCSV:
-                contig_num = contig_names_rev[row[0]]
 
-                bin_num = bins_list.index(row[1])
-                bins[bin_num].append(contig_num)
+def read_assembly_info(contig_paths):
+    # Yield the name, coverage and path segments of each contig in assembly_info.txt
+    with open(contig_paths) as file:
+        for line in file:
+            if not line.startswith("#"):
+                strings = line.strip().split()
 
-    except BaseException as err:
-        logger.error(f"Unexpected {err}")
-        logger.error(
-            "Please make sure that you have provided the correct assembler type and the correct path to the binning result file in the correct format."
-        )
-        logger.info("Exiting GraphBin... Bye...!")
-        sys.exit(1)
+                path = strings[-1]
+                path = path.replace("*", "")
 
-    return bins
+                if path.startswith(","):
+                    path = path[1:]
 
+                if path.endswith(","):
+                    path = path[:-1]
 
-def parse_graph(assembly_graph_file, contig_paths):
-    # Get contig names
-    # -----------------------------------
+                yield strings[0], float(strings[2]), path.rstrip().split(",")
 
-    contig_names = BidirectionalMap()
 
-    contig_num = 0
+def get_gfa_contig_paths(gfa_paths):
+    # Yield the contig paths given as GFA P or W lines like read_assembly_info,
+    # writing segments edge_<n>+ and edge_<n>- as <n> and -<n>. Coverages of
+    # contigs are not available from the assembly graph
+    for name, segments in gfa_paths:
+        yield name, None, [
+            segment[5:-1] if segment.endswith("+") else "-" + segment[5:-1]
+            for segment in segments
+        ]
 
-    with open(contig_paths, "r") as file:
-        for line in file.readlines():
-            if not line.startswith("#"):
-                name = line.strip().split()[0]
-                contig_names[contig_num] = name
-                contig_num += 1
 
-    contig_names_rev = contig_names.inverse
+def get_contig_edges(segment_ids, path_segments, path_offsets, links_map):
+    # Edges between contigs sharing a segment or having linked segments. The
+    # path of contig i is path_segments[path_offsets[i] : path_offsets[i + 1]]
+    # as IDs of segment_ids, and links_map holds the links of each segment
+    node_count = len(path_offsets) - 1
 
-    # Get the paths and edges
-    # -----------------------------------
+    segment_names = list(segment_ids)
 
-    paths = {}
-    segment_contigs = {}
+    # Contigs of each segment as a CSR index over segment IDs
+    path_contigs = np.repeat(np.arange(node_count), np.diff(path_offsets))
+    path_segment_ids = np.array(path_segments, dtype=np.int64)
+    in_segment = path_segment_ids != segment_ids.get("", -1)
 
-    try:
-        with open(contig_paths) as file:
-            for line in file.readlines():
-                if not line.startswith("#"):
-                    strings = line.strip().split()
+    segment_starts, segment_contig_ids = get_segment_contigs_index(
+        path_segment_ids[in_segment],
+        path_contigs[in_segment],
+        len(segment_names),
+        node_count,
+    )
+
+    def get_segment_contigs(segment):
+        segment_id = segment_ids.get(segment)
 
-                    contig_name = strings[0]
+        if segment_id is None:
+            return []
 
-                    path = strings[-1]
-                    path = path.replace("*", "")
+        return segment_contig_ids[
+            segment_starts[segment_id] : segment_starts[segment_id + 1]
+        ]
 
-                    if path.startswith(","):
-                        path = path[1:]
+    # Create list of edges
+    edge_list = []
 
-                    if path.endswith(","):
-                        path = path[:-1]
+    for i in range(node_count):
+        new_links = []
 
-                    segments = path.rstrip().split(",")
+        for segment_id in path_segments[path_offsets[i] : path_offsets[i + 1]]:
+            my_segment = segment_names[segment_id]
+            my_segment_num = ""
 
-                    contig_num = contig_names_rev[contig_name]
+            my_segment_rev = ""
 
-                    if contig_num not in paths:
-                        paths[contig_num] = segments
+            if my_segment.startswith("-"):
+                my_segment_rev = my_segment[1:]
+                my_segment_num = my_segment[1:]
+            else:
+                my_segment_rev = "-" + my_segment
+                my_segment_num = my_segment
 
-                    for segment in segments:
-                        if segment != "":
-                            if segment not in segment_contigs:
-                                segment_contigs[segment] = set([contig_num])
-                            else:
-                                segment_contigs[segment].add(contig_num)
+            if my_segment in links_map:
+                new_links.extend(list(links_map[my_segment]))
 
-        links_map = defaultdict(set)
+            if my_segment_rev in links_map:
+                new_links.extend(list(links_map[my_segment_rev]))
 
-        # Get links from assembly_graph.gfa
-        with open(assembly_graph_file) as file:
-            for line in file.readlines():
-                line = line.strip()
+            for segment in [my_segment, my_segment_rev, my_segment_num]:
+                for contig in get_segment_contigs(segment):
+                    if i != contig:
+                        # Add edge to list of edges
+                        edge_list.append((i, contig))
+
+        for new_link in new_links:
+            linked_contigs = get_segment_contigs(new_link)
+
+            if new_link.startswith("-"):
+                linked_contigs = linked_contigs + get_segment_contigs(new_link[1:])
+
+            for contig in linked_contigs:
+                if i != contig:
+                    # Add edge to list of edges
+                    edge_list.append((i, contig))
+
+    return edge_list
+
+
+def parse_graph(assembly_graph_file, contig_paths=None):
+    # Get contig names and paths
+    # -----------------------------------
+
+    contig_names = BidirectionalMap()
+
+    coverages = array("d")
+
+    # Paths of the contigs as segment IDs, stored one after the other with the
+    # offset at which each path starts
+    segment_ids = {}
+    path_segments = array("l")
+    path_offsets = array("l", [0])
+
+    contig_num = 0
+
+    links_map = defaultdict(set)
 
+    # Paths given as P or W lines of the assembly graph
+    gfa_paths = []
+
+    try:
+        # Get links (and paths if there is no assembly_info.txt file) from
+        # assembly_graph.gfa
+        with open(assembly_graph_file) as file:
+            for line in file:
                 # Identify lines with link information
                 if line.startswith("L"):
-                    strings = line.split("\t")
+                    strings = line.strip().split("\t")
 
                     f1, f2 = "", ""
 
@@ -133,66 +193,46 @@ def parse_graph(assembly_graph_file, contig_paths):
                     links_map[f1].add(f2)
                     links_map[f2].add(f1)
 
-        # Create list of edges
-        edge_list = []
+                elif contig_paths is None and line.startswith(("P", "W")):
+                    gfa_paths.append(get_gfa_path(line))
+
+    except BaseException as err:
+        logger.error(f"Unexpected {err}")
+        logger.error(
+            "Please make sure that the correct path to the assembly graph file is provided."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    if contig_paths is None and len(gfa_paths) == 0:
+        logger.error(
+            "The assembly graph does not contain contig paths. Please make sure to provide the path to the assembly_info.txt file."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    try:
+        if contig_paths is None:
+            path_records = get_gfa_contig_paths(gfa_paths)
+        else:
+            path_records = read_assembly_info(contig_paths)
 
-        for i in paths:
-            segments = paths[i]
+        for name, coverage, segments in path_records:
+            contig_names[contig_num] = name
 
-            new_links = []
+            if coverage is not None:
+                coverages.append(coverage)
 
             for segment in segments:
-                my_segment = segment
-                my_segment_num = ""
-
-                my_segment_rev = ""
-
-                if my_segment.startswith("-"):
-                    my_segment_rev = my_segment[1:]
-                    my_segment_num = my_segment[1:]
-                else:
-                    my_segment_rev = "-" + my_segment
-                    my_segment_num = my_segment
-
-                if my_segment in links_map:
-                    new_links.extend(list(links_map[my_segment]))
-
-                if my_segment_rev in links_map:
-                    new_links.extend(list(links_map[my_segment_rev]))
-
-                if my_segment in segment_contigs:
-                    for contig in segment_contigs[my_segment]:
-                        if i != contig:
-                            # Add edge to list of edges
-                            edge_list.append((i, contig))
-
-                if my_segment_rev in segment_contigs:
-                    for contig in segment_contigs[my_segment_rev]:
-                        if i != contig:
-                            # Add edge to list of edges
-                            edge_list.append((i, contig))
-
-                if my_segment_num in segment_contigs:
-                    for contig in segment_contigs[my_segment_num]:
-                        if i != contig:
-                            # Add edge to list of edges
-                            edge_list.append((i, contig))
-
-            for new_link in new_links:
-                if new_link in segment_contigs:
-                    for contig in segment_contigs[new_link]:
-                        if i != contig:
-                            # Add edge to list of edges
-                            edge_list.append((i, contig))
-
-                if new_link.startswith("-"):
-                    if new_link[1:] in segment_contigs:
-                        for contig in segment_contigs[new_link[1:]]:
-                            if i != contig:
-                                # Add edge to list of edges
-                                edge_list.append((i, contig))
-
-        node_count = len(contig_names_rev)
+                path_segments.append(segment_ids.setdefault(segment, len(segment_ids)))
+
+            path_offsets.append(len(path_segments))
+
+            contig_num += 1
+
+        node_count = contig_num
+
+        edge_list = get_contig_edges(segment_ids, path_segments, path_offsets, links_map)
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
@@ -215,9 +255,11 @@ def parse_graph(assembly_graph_file, contig_paths):
         assembly_graph.add_vertices(node_count)
 
         # Name vertices
-        for i in range(len(assembly_graph.vs)):
-            assembly_graph.vs[i]["id"] = i
-            assembly_graph.vs[i]["label"] = str(contig_names[i])
+        assembly_graph.vs["id"] = list(range(node_count))
+        assembly_graph.vs["label"] = [str(contig_names[i]) for i in range(node_count)]
+
+        if len(coverages) == node_count:
+            assembly_graph.vs["coverage"] = coverages
 
         # Add edges to the graph
         assembly_graph.add_edges(edge_list)
@@ -247,8 +289,14 @@ def write_output(
     bins_list,
     delimiter,
     node_count,
-    remove_labels,
+    removed,
     non_isolated,
+    initial_bins=None,
+    scores=None,
+    columnar=False,
+    table_only=False,
+    bin_layout="files",
+    compress_bins=False,
 ):
     logger.info("Writing the Final Binning result to file")
 
@@ -256,26 +304,31 @@ def write_output(
 
     output_bins_path = f"{output_path}{prefix}bins/"
     output_file = f"{output_path}{prefix}graphbin_output.csv"
+    output_stats_file = f"{output_path}{prefix}graphbin_bin_stats.tsv"
 
-    if not os.path.isdir(output_bins_path):
-        subprocess.run(f"mkdir -p {output_bins_path}", shell=True)
+    if not table_only:
+        contigs_index = FastaIndex(contigs_file)
 
-    bin_files = {}
+        # Records of the contigs of each bin, in the order of the contigs file
+        bin_records = defaultdict(list)
 
-    for bin_name in set(final_bins.values()):
-        bin_files[bin_name] = open(
-            f"{output_bins_path}{prefix}bin_{bin_name}.fasta", "w+"
-        )
+        for record, label in enumerate(contigs_index.labels):
+            contig_num = contig_names_rev[label]
 
-    for label, seq in MinimalFastaParser(contigs_file):
-        contig_num = contig_names_rev[label]
+            if contig_num in final_bins:
+                bin_records[final_bins[contig_num]].append((record, label))
 
-        if contig_num in final_bins:
-            bin_files[final_bins[contig_num]].write(f">{label}\n{seq}\n")
+        write_bins(
+            contigs_index,
+            bin_records,
+            output_bins_path,
+            prefix,
+            bin_layout,
+            compress_bins,
+            output_stats_file,
+        )
 
-    # Close output files
-    for c in set(final_bins.values()):
-        bin_files[c].close()
+        contigs_index.close()
 
     for b in range(len(bins)):
         # with open(output_bins_path + "bin_" + str(b+1) + "_ids.txt", "w") as bin_file:
@@ -295,15 +348,13 @@ def write_output(
         for row in output_bins:
             output_writer.writerow(row)
 
-    logger.info(f"Final binning results can be found in {output_bins_path}")
-
-    unbinned_contigs = []
+    if table_only:
+        logger.info(f"Final binning results can be found at {output_file}")
+    else:
+        logger.info(f"Final binning results can be found in {output_bins_path}")
 
-    for i in range(node_count):
-        if i in remove_labels or i not in non_isolated:
-            line = []
-            line.append(str(contig_names[i]))
-            unbinned_contigs.append(line)
+    # Contigs whose labels were removed or that are isolated are unbinned
+    unbinned_contigs = np.flatnonzero(removed | ~non_isolated)
 
     if len(unbinned_contigs) != 0:
         unbinned_file = f"{output_path}{prefix}graphbin_unbinned.csv"
@@ -313,7 +364,24 @@ def write_output(
                 out_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL
             )
 
-            for row in unbinned_contigs:
-                output_writer.writerow(row)
+            output_writer.writerows(
+                [str(contig_names[i])] for i in unbinned_contigs.tolist()
+            )
 
         logger.info(f"Unbinned contigs can be found at {unbinned_file}")
+
+    if columnar:
+        columnar_file = f"{output_path}{prefix}graphbin_output.npz"
+
+        write_columnar_output(
+            columnar_file,
+            [str(contig_names[i]) for i in range(node_count)],
+            bins_list,
+            initial_bins,
+            bins,
+            removed,
+            non_isolated,
+            scores,
+        )
+
+        logger.info(f"Columnar binning results can be found at {columnar_file}")
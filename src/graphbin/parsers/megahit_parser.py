@@ -1,16 +1,27 @@
 #!/usr/bin/env python3
 
 import csv
+import hashlib
 import logging
-import os
 import re
-import subprocess
 import sys
 
-from cogent3.parse.fasta import MinimalFastaParser
+from array import array
+from collections import defaultdict, deque
+
+import numpy as np
+
 from igraph import *
 
 from graphbin.bidirectionalmap.bidirectionalmap import BidirectionalMap
+from graphbin.parsers import (
+    get_coverage,
+    get_overlap_length,
+    read_initial_binning,
+    write_columnar_output,
+)
+from graphbin.parsers.bin_fasta import write_bins
+from graphbin.parsers.fasta_index import FastaIndex
 
 
 __author__ = "Vijini Mallawaarachchi"
@@ -25,52 +36,48 @@ __status__ = "Production"
 
 logger = logging.getLogger(f"GraphBin {__version__}")
 
+COMPLEMENT = str.maketrans("ACGTacgt", "TGCAtgca")
+
 
 def get_initial_binning_result(
-    n_bins,
-    bins_list,
-    contig_bins_file,
-    contigs_map_rev,
-    graph_to_contig_map_rev,
-    delimiter,
+    contig_bins_file, contigs_map_rev, graph_to_contig_map_rev, node_count, delimiter
 ):
-    logger.info("Obtaining the initial binning result")
+    def get_contig_num(contig_name):
+        return contigs_map_rev[int(graph_to_contig_map_rev[contig_name])]
 
-    bins = [[] for x in range(n_bins)]
+    return read_initial_binning(contig_bins_file, delimiter, node_count, get_contig_num)
 
-    try:
-        with open(contig_bins_file) as contig_bins:
-            readCSV = csv.reader(contig_bins, delimiter=delimiter)
-            for row in readCSV:
-                contig_num = contigs_map_rev[int(graph_to_contig_map_rev[row[0]])]
 
-                bin_num = bins_list.index(row[1])
-                bins[bin_num].append(contig_num)
-
-    except BaseException as err:
-        logger.error(f"Unexpected {err}")
-        logger.error(
-            "Please make sure that you have provided the correct assembler type and the correct path to the binning result file in the correct format."
-        )
-        logger.info("Exiting GraphBin... Bye...!")
-        sys.exit(1)
-
-    return bins
+def get_sequence_digest(seq):
+    # 64-bit digest of a sequence
+    return hashlib.blake2b(seq.encode(), digest_size=8).digest()
 
 
 def parse_graph(assembly_graph_file, original_contigs):
     node_count = 0
 
-    graph_contigs = {}
+    # Digests of the original contigs (contigs with identical sequences are kept
+    # in the order of the contigs file)
+    contig_digests = defaultdict(deque)
+
+    for record, label in enumerate(original_contigs.labels):
+        seq = original_contigs.get_sequence(record)
+        contig_digests[get_sequence_digest(seq)].append(label.split()[0])
+
+    # Map original contig IDs to contig IDS of assembly graph
+    graph_to_contig_map = BidirectionalMap()
 
     links = []
+    overlaps = array("l")
+
+    coverages = array("d")
 
     my_map = BidirectionalMap()
 
     try:
         # Get links from .gfa file
         with open(assembly_graph_file) as file:
-            for line in file.readlines():
+            for line in file:
                 line = line.strip()
 
                 # Identify lines with link information
@@ -96,6 +103,9 @@ def parse_graph(assembly_graph_file, original_contigs):
                     link.append(link1)
                     link.append(link2)
                     links.append(link)
+                    overlaps.append(
+                        get_overlap_length(strings[5]) if len(strings) > 5 else 0
+                    )
 
                 elif line.startswith("S"):
                     strings = line.split()
@@ -109,7 +119,21 @@ def parse_graph(assembly_graph_file, original_contigs):
 
                     my_map[node_count] = int(contig_num)
 
-                    graph_contigs[contig_num] = strings[2]
+                    # Match the segment to an original contig with the same sequence
+                    # or its reverse complement
+                    seq = strings[2]
+                    matches = contig_digests.get(get_sequence_digest(seq))
+
+                    if not matches:
+                        reverse_complement = seq.translate(COMPLEMENT)[::-1]
+                        matches = contig_digests.get(
+                            get_sequence_digest(reverse_complement)
+                        )
+
+                    if matches:
+                        graph_to_contig_map[contig_num] = matches.popleft()
+
+                    coverages.append(get_coverage(strings[1]))
 
                     node_count += 1
 
@@ -126,21 +150,27 @@ def parse_graph(assembly_graph_file, original_contigs):
 
         # Create list of edges
         edge_list = []
+        edge_overlaps = array("l")
 
         for i in range(node_count):
             assembly_graph.vs[i]["id"] = i
             assembly_graph.vs[i]["label"] = str(contigs_map[i])
 
+        assembly_graph.vs["coverage"] = coverages
+
         # Iterate links
-        for link in links:
+        for link, overlap in zip(links, overlaps):
             # Remove self loops
             if link[0] != link[1]:
                 # Add edge to list of edges
                 edge_list.append((contigs_map_rev[link[0]], contigs_map_rev[link[1]]))
+                edge_overlaps.append(overlap)
 
         # Add edges to the graph
-        assembly_graph.add_edges(edge_list)
-        assembly_graph.simplify(multiple=True, loops=False, combine_edges=None)
+        assembly_graph.add_edges(edge_list, attributes={"overlap": edge_overlaps})
+        assembly_graph.simplify(
+            multiple=True, loops=False, combine_edges={"overlap": "max"}
+        )
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
@@ -152,15 +182,6 @@ def parse_graph(assembly_graph_file, original_contigs):
 
     logger.info(f"Total number of edges in the assembly graph: {len(edge_list)}")
 
-    # Map original contig IDs to contig IDS of assembly graph
-    # --------------------------------------------------------
-
-    graph_to_contig_map = BidirectionalMap()
-
-    for (n, m), (n2, m2) in zip(graph_contigs.items(), original_contigs.items()):
-        if m == m2:
-            graph_to_contig_map[n] = n2
-
     return assembly_graph, graph_to_contig_map, contigs_map, node_count
 
 
@@ -175,8 +196,14 @@ def write_output(
     bins_list,
     delimiter,
     node_count,
-    remove_labels,
+    removed,
     non_isolated,
+    initial_bins=None,
+    scores=None,
+    columnar=False,
+    table_only=False,
+    bin_layout="files",
+    compress_bins=False,
 ):
     logger.info("Writing the Final Binning result to file")
 
@@ -186,28 +213,32 @@ def write_output(
 
     output_bins_path = f"{output_path}{prefix}bins/"
     output_file = f"{output_path}{prefix}graphbin_output.csv"
+    output_stats_file = f"{output_path}{prefix}graphbin_bin_stats.tsv"
 
-    if not os.path.isdir(output_bins_path):
-        subprocess.run(f"mkdir -p {output_bins_path}", shell=True)
+    if not table_only:
+        contigs_index = FastaIndex(contigs_file)
 
-    bin_files = {}
+        # Records of the contigs of each bin, in the order of the contigs file
+        bin_records = defaultdict(list)
 
-    for bin_name in set(final_bins.values()):
-        bin_files[bin_name] = open(
-            f"{output_bins_path}{prefix}bin_{bin_name}.fasta", "w+"
-        )
+        for record, label in enumerate(contigs_index.labels):
+            name = label.split()[0]
+            contig_num = contigs_map_rev[graph_to_contig_map_rev[name]]
 
-    for label, seq in MinimalFastaParser(
-        contigs_file, label_to_name=lambda x: x.split()[0]
-    ):
-        contig_num = contigs_map_rev[graph_to_contig_map_rev[label]]
+            if contig_num in final_bins:
+                bin_records[final_bins[contig_num]].append((record, name))
 
-        if contig_num in final_bins:
-            bin_files[final_bins[contig_num]].write(f">{label}\n{seq}\n")
+        write_bins(
+            contigs_index,
+            bin_records,
+            output_bins_path,
+            prefix,
+            bin_layout,
+            compress_bins,
+            output_stats_file,
+        )
 
-    # Close output files
-    for c in set(final_bins.values()):
-        bin_files[c].close()
+        contigs_index.close()
 
     for b in range(len(bins)):
         for contig in bins[b]:
@@ -223,15 +254,13 @@ def write_output(
         for row in output_bins:
             output_writer.writerow(row)
 
-    logger.info(f"Final binning results can be found in {output_bins_path}")
+    if table_only:
+        logger.info(f"Final binning results can be found at {output_file}")
+    else:
+        logger.info(f"Final binning results can be found in {output_bins_path}")
 
-    unbinned_contigs = []
-
-    for i in range(node_count):
-        if i in remove_labels or i not in non_isolated:
-            line = []
-            line.append(graph_to_contig_map[contigs_map[i]])
-            unbinned_contigs.append(line)
+    # Contigs whose labels were removed or that are isolated are unbinned
+    unbinned_contigs = np.flatnonzero(removed | ~non_isolated)
 
     if len(unbinned_contigs) != 0:
         unbinned_file = f"{output_path}{prefix}graphbin_unbinned.csv"
@@ -241,19 +270,29 @@ def write_output(
                 out_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL
             )
 
-            for row in unbinned_contigs:
-                output_writer.writerow(row)
+            output_writer.writerows(
+                [graph_to_contig_map[contigs_map[i]]] for i in unbinned_contigs.tolist()
+            )
 
         logger.info(f"Unbinned contigs can be found at {unbinned_file}")
 
+    if columnar:
+        columnar_file = f"{output_path}{prefix}graphbin_output.npz"
+
+        write_columnar_output(
+            columnar_file,
+            [graph_to_contig_map[contigs_map[i]] for i in range(node_count)],
+            bins_list,
+            initial_bins,
+            bins,
+            removed,
+            non_isolated,
+            scores,
+        )
 
-def get_contig_descriptors(contigs_file):
-    original_contigs = {}
-    contig_descriptions = {}
+        logger.info(f"Columnar binning results can be found at {columnar_file}")
 
-    for label, seq in MinimalFastaParser(contigs_file):
-        name = label.split()[0]
-        original_contigs[name] = seq
-        contig_descriptions[name] = label
 
-    return original_contigs
+def get_contig_descriptors(contigs_file):
+    # Index the contigs file so that sequences are read only when needed
+    return FastaIndex(contigs_file)
@@ -2,14 +2,22 @@
 
 import csv
 import logging
-import os
-import subprocess
 import sys
 
-from cogent3.parse.fasta import MinimalFastaParser
+from collections import defaultdict
+
+import numpy as np
+
 from igraph import *
 
 from graphbin.bidirectionalmap.bidirectionalmap import BidirectionalMap
+from graphbin.parsers import (
+    read_gfa_links,
+    read_initial_binning,
+    write_columnar_output,
+)
+from graphbin.parsers.bin_fasta import write_bins
+from graphbin.parsers.fasta_index import FastaIndex
 
 
 __author__ = "Vijini Mallawaarachchi"
@@ -26,69 +34,22 @@ logger = logging.getLogger(f"GraphBin {__version__}")
 
 
 def get_initial_binning_result(
-    n_bins, bins_list, contig_bins_file, contigs_map_rev, delimiter
+    contig_bins_file, contigs_map_rev, node_count, delimiter
 ):
-    logger.info("Obtaining the initial binning result")
+    def get_contig_num(contig_name):
+        return contigs_map_rev[contig_name]
 
-    bins = [[] for x in range(n_bins)]
-
-    try:
-        with open(contig_bins_file) as contig_bins:
-            readCSV = csv.reader(contig_bins, delimiter=delimiter)
-            for row in readCSV:
-                contig_num = contigs_map_rev[row[0]]
-
-                bin_num = bins_list.index(row[1])
-                bins[bin_num].append(contig_num)
-
-    except BaseException as err:
-        logger.error(f"Unexpected {err}")
-        logger.error(
-            "Please make sure that you have provided the correct assembler type and the correct path to the binning result file in the correct format."
-        )
-        logger.info("Exiting GraphBin... Bye...!")
-        sys.exit(1)
-
-    return bins
+    return read_initial_binning(contig_bins_file, delimiter, node_count, get_contig_num)
 
 
 def parse_graph(assembly_graph_file):
     # Get the links from the .gfa file
     # -----------------------------------
 
-    my_map = BidirectionalMap()
-
-    node_count = 0
-
-    nodes = []
-
-    links = []
-
     try:
-        # Get contig connections from .gfa file
-        with open(assembly_graph_file) as file:
-            for line in file.readlines():
-                line = line.strip()
-
-                # Count the number of contigs
-                if line.startswith("S"):
-                    strings = line.split("\t")
-                    my_node = strings[1]
-                    my_map[node_count] = my_node
-                    nodes.append(my_node)
-                    node_count += 1
-
-                # Identify lines with link information
-                elif line.startswith("L"):
-                    link = []
-                    strings = line.split("\t")
-
-                    if strings[1] != strings[3]:
-                        start = strings[1]
-                        end = strings[3]
-                        link.append(start)
-                        link.append(end)
-                        links.append(link)
+        segment_names, edge_sources, edge_targets, overlaps = read_gfa_links(
+            assembly_graph_file
+        )
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
@@ -98,8 +59,12 @@ def parse_graph(assembly_graph_file):
         logger.info("Exiting GraphBin... Bye...!")
         sys.exit(1)
 
-    contigs_map = my_map
-    contigs_map_rev = my_map.inverse
+    node_count = len(segment_names)
+
+    contigs_map = BidirectionalMap()
+
+    for i in range(node_count):
+        contigs_map[i] = segment_names[i]
 
     logger.info(f"Total number of contigs available: {node_count}")
 
@@ -110,27 +75,21 @@ def parse_graph(assembly_graph_file):
         # Create the graph
         assembly_graph = Graph()
 
-        # Create list of edges
-        edge_list = []
-
         # Add vertices
         assembly_graph.add_vertices(node_count)
 
         # Name vertices
-        for i in range(len(assembly_graph.vs)):
-            assembly_graph.vs[i]["id"] = i
-            assembly_graph.vs[i]["label"] = str(contigs_map[i])
-
-        # Iterate links
-        for link in links:
-            # Remove self loops
-            if link[0] != link[1]:
-                # Add edge to list of edges
-                edge_list.append((contigs_map_rev[link[0]], contigs_map_rev[link[1]]))
+        assembly_graph.vs["id"] = list(range(node_count))
+        assembly_graph.vs["label"] = [str(contigs_map[i]) for i in range(node_count)]
 
         # Add edges to the graph
-        assembly_graph.add_edges(edge_list)
-        assembly_graph.simplify(multiple=True, loops=False, combine_edges=None)
+        assembly_graph.add_edges(
+            zip(edge_sources.tolist(), edge_targets.tolist()),
+            attributes={"overlap": overlaps},
+        )
+        assembly_graph.simplify(
+            multiple=True, loops=False, combine_edges={"overlap": "max"}
+        )
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
@@ -140,7 +99,7 @@ def parse_graph(assembly_graph_file):
         logger.info("Exiting GraphBin... Bye...!")
         sys.exit(1)
 
-    logger.info(f"Total number of edges in the assembly graph: {len(edge_list)}")
+    logger.info(f"Total number of edges in the assembly graph: {len(edge_sources)}")
 
     return assembly_graph, contigs_map, node_count
 
@@ -155,8 +114,14 @@ def write_output(
     bins_list,
     delimiter,
     node_count,
-    remove_labels,
+    removed,
     non_isolated,
+    initial_bins=None,
+    scores=None,
+    columnar=False,
+    table_only=False,
+    bin_layout="files",
+    compress_bins=False,
 ):
     logger.info("Writing the Final Binning result to file")
 
@@ -165,26 +130,31 @@ def write_output(
 
     output_bins_path = f"{output_path}{prefix}bins/"
     output_file = f"{output_path}{prefix}graphbin_output.csv"
+    output_stats_file = f"{output_path}{prefix}graphbin_bin_stats.tsv"
 
-    if not os.path.isdir(output_bins_path):
-        subprocess.run(f"mkdir -p {output_bins_path}", shell=True)
+    if not table_only:
+        contigs_index = FastaIndex(contigs_file)
 
-    bin_files = {}
+        # Records of the contigs of each bin, in the order of the contigs file
+        bin_records = defaultdict(list)
 
-    for bin_name in set(final_bins.values()):
-        bin_files[bin_name] = open(
-            f"{output_bins_path}{prefix}bin_{bin_name}.fasta", "w+"
-        )
+        for record, label in enumerate(contigs_index.labels):
+            contig_num = contigs_map_rev[label]
 
-    for label, seq in MinimalFastaParser(contigs_file):
-        contig_num = contigs_map_rev[label]
+            if contig_num in final_bins:
+                bin_records[final_bins[contig_num]].append((record, label))
 
-        if contig_num in final_bins:
-            bin_files[final_bins[contig_num]].write(f">{label}\n{seq}\n")
+        write_bins(
+            contigs_index,
+            bin_records,
+            output_bins_path,
+            prefix,
+            bin_layout,
+            compress_bins,
+            output_stats_file,
+        )
 
-    # Close output files
-    for c in set(final_bins.values()):
-        bin_files[c].close()
+        contigs_index.close()
 
     for b in range(len(bins)):
         for contig in bins[b]:
@@ -200,15 +170,13 @@ def write_output(
         for row in output_bins:
             output_writer.writerow(row)
 
-    logger.info(f"Final binning results can be found in {output_bins_path}")
-
-    unbinned_contigs = []
+    if table_only:
+        logger.info(f"Final binning results can be found at {output_file}")
+    else:
+        logger.info(f"Final binning results can be found in {output_bins_path}")
 
-    for i in range(node_count):
-        if i in remove_labels or i not in non_isolated:
-            line = []
-            line.append(str(contigs_map[i]))
-            unbinned_contigs.append(line)
+    # Contigs whose labels were removed or that are isolated are unbinned
+    unbinned_contigs = np.flatnonzero(removed | ~non_isolated)
 
     if len(unbinned_contigs) != 0:
         unbinned_file = f"{output_path}{prefix}graphbin_unbinned.csv"
@@ -218,7 +186,24 @@ def write_output(
                 out_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL
             )
 
-            for row in unbinned_contigs:
-                output_writer.writerow(row)
+            output_writer.writerows(
+                [str(contigs_map[i])] for i in unbinned_contigs.tolist()
+            )
 
         logger.info(f"Unbinned contigs can be found at {unbinned_file}")
+
+    if columnar:
+        columnar_file = f"{output_path}{prefix}graphbin_output.npz"
+
+        write_columnar_output(
+            columnar_file,
+            [str(contigs_map[i]) for i in range(node_count)],
+            bins_list,
+            initial_bins,
+            bins,
+            removed,
+            non_isolated,
+            scores,
+        )
+
+        logger.info(f"Columnar binning results can be found at {columnar_file}")
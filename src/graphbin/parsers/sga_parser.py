@@ -2,15 +2,20 @@
 
 import csv
 import logging
-import os
 import re
-import subprocess
 import sys
 
-from cogent3.parse.fasta import MinimalFastaParser
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
 from igraph import *
 
 from graphbin.bidirectionalmap.bidirectionalmap import BidirectionalMap
+from graphbin.parsers import read_initial_binning, write_columnar_output
+from graphbin.parsers.bin_fasta import write_bins
+from graphbin.parsers.fasta_index import FastaIndex
 
 
 __author__ = "Vijini Mallawaarachchi"
@@ -27,40 +32,26 @@ logger = logging.getLogger(f"GraphBin {__version__}")
 
 
 def get_initial_binning_result(
-    n_bins, bins_list, contig_bins_file, contigs_map_rev, delimiter
+    contig_bins_file, contigs_map_rev, node_count, delimiter
 ):
-    logger.info("Obtaining the initial binning result")
-
-    bins = [[] for x in range(n_bins)]
-
-    try:
-        with open(contig_bins_file) as contig_bins:
-            readCSV = csv.reader(contig_bins, delimiter=delimiter)
-            for row in readCSV:
-                start = "contig-"
-                end = ""
-                contig_num = contigs_map_rev[
-                    int(re.search("%s(.*)%s" % (start, end), row[0]).group(1))
-                ]
-
-                bin_num = bins_list.index(row[1])
-                bins[bin_num].append(contig_num)
-
-    except BaseException as err:
-        logger.error(f"Unexpected {err}")
-        logger.error(
-            "Please make sure that you have provided the correct assembler type and the correct path to the binning result file in the correct format."
-        )
-        logger.info("Exiting GraphBin... Bye...!")
-        sys.exit(1)
+    def get_contig_num(contig_name):
+        start = "contig-"
+        end = ""
+        return contigs_map_rev[
+            int(re.search("%s(.*)%s" % (start, end), contig_name).group(1))
+        ]
 
-    return bins
+    return read_initial_binning(contig_bins_file, delimiter, node_count, get_contig_num)
 
 
 def parse_graph(assembly_graph_file):
-    links = []
+    # Edges between vertex IDs, with self loops removed while reading
+    edge_sources = array("l")
+    edge_targets = array("l")
+    edge_overlaps = array("l")
 
     contig_names = BidirectionalMap()
+    contig_names_rev = contig_names.inverse
 
     my_map = BidirectionalMap()
 
@@ -69,28 +60,32 @@ def parse_graph(assembly_graph_file):
     try:
         # Get contig connections from .asqg file
         with open(assembly_graph_file) as file:
-            for line in file.readlines():
-                line = line.strip()
-
+            for line in file:
                 # Count the number of contigs
                 if line.startswith("VT"):
                     start = "contig-"
                     end = ""
-                    contig_name = str(line.split()[1])
+                    contig_name = line.split(maxsplit=2)[1]
                     contig_num = int(
                         re.search("%s(.*)%s" % (start, end), contig_name).group(1)
                     )
                     my_map[node_count] = contig_num
-                    contig_names[node_count] = contig_name.strip()
+                    contig_names[node_count] = contig_name
                     node_count += 1
 
                 # Identify lines with link information
                 elif line.startswith("ED"):
-                    link = []
-                    strings = line.split("\t")[1].split()
-                    link.append(int(strings[0][7:]))
-                    link.append(int(strings[1][7:]))
-                    links.append(link)
+                    strings = line.split()
+                    source = contig_names_rev[strings[1]]
+                    target = contig_names_rev[strings[2]]
+
+                    # Remove self loops
+                    if source != target:
+                        edge_sources.append(source)
+                        edge_targets.append(target)
+
+                        # overlap spans [start, end] of the first contig
+                        edge_overlaps.append(int(strings[4]) - int(strings[3]) + 1)
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
@@ -101,9 +96,6 @@ def parse_graph(assembly_graph_file):
         sys.exit(1)
 
     contigs_map = my_map
-    contigs_map_rev = my_map.inverse
-
-    contig_names_rev = contig_names.inverse
 
     logger.info(f"Total number of contigs available: {node_count}")
 
@@ -111,27 +103,20 @@ def parse_graph(assembly_graph_file):
         # Create the graph
         assembly_graph = Graph()
 
-        # Create list of edges
-        edge_list = []
-
         # Add vertices
         assembly_graph.add_vertices(node_count)
 
         # Name vertices
-        for i in range(len(assembly_graph.vs)):
-            assembly_graph.vs[i]["id"] = i
-            assembly_graph.vs[i]["label"] = str(contigs_map[i])
-
-        # Iterate links
-        for link in links:
-            # Remove self loops
-            if link[0] != link[1]:
-                # Add edge to list of edges
-                edge_list.append((contigs_map_rev[link[0]], contigs_map_rev[link[1]]))
+        assembly_graph.vs["id"] = list(range(node_count))
+        assembly_graph.vs["label"] = [str(contigs_map[i]) for i in range(node_count)]
 
         # Add edges to the graph
-        assembly_graph.add_edges(edge_list)
-        assembly_graph.simplify(multiple=True, loops=False, combine_edges=None)
+        assembly_graph.add_edges(
+            zip(edge_sources, edge_targets), attributes={"overlap": edge_overlaps}
+        )
+        assembly_graph.simplify(
+            multiple=True, loops=False, combine_edges={"overlap": "max"}
+        )
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
@@ -141,7 +126,7 @@ def parse_graph(assembly_graph_file):
         logger.info("Exiting GraphBin... Bye...!")
         sys.exit(1)
 
-    logger.info(f"Total number of edges in the assembly graph: {len(edge_list)}")
+    logger.info(f"Total number of edges in the assembly graph: {len(edge_sources)}")
 
     return assembly_graph, contigs_map, contig_names, node_count
 
@@ -157,9 +142,15 @@ def write_output(
     bins_list,
     delimiter,
     node_count,
-    remove_labels,
+    removed,
     non_isolated,
     contig_descriptions,
+    initial_bins=None,
+    scores=None,
+    columnar=False,
+    table_only=False,
+    bin_layout="files",
+    compress_bins=False,
 ):
     logger.info("Writing the Final Binning result to file")
 
@@ -167,28 +158,32 @@ def write_output(
 
     output_bins_path = f"{output_path}{prefix}bins/"
     output_file = f"{output_path}{prefix}graphbin_output.csv"
+    output_stats_file = f"{output_path}{prefix}graphbin_bin_stats.tsv"
 
-    if not os.path.isdir(output_bins_path):
-        subprocess.run(f"mkdir -p {output_bins_path}", shell=True)
+    if not table_only:
+        contigs_index = FastaIndex(contigs_file)
 
-    bin_files = {}
+        # Records of the contigs of each bin, in the order of the contigs file
+        bin_records = defaultdict(list)
 
-    for bin_name in set(final_bins.values()):
-        bin_files[bin_name] = open(
-            f"{output_bins_path}{prefix}bin_{bin_name}.fasta", "w+"
-        )
+        for record, label in enumerate(contigs_index.labels):
+            name = label.split()[0]
+            contig_num = contig_names_rev[name]
 
-    for label, seq in MinimalFastaParser(
-        contigs_file, label_to_name=lambda x: x.split()[0]
-    ):
-        contig_num = contig_names_rev[label]
+            if contig_num in final_bins:
+                bin_records[final_bins[contig_num]].append((record, name))
 
-        if contig_num in final_bins:
-            bin_files[final_bins[contig_num]].write(f">{label}\n{seq}\n")
+        write_bins(
+            contigs_index,
+            bin_records,
+            output_bins_path,
+            prefix,
+            bin_layout,
+            compress_bins,
+            output_stats_file,
+        )
 
-    # Close output files
-    for c in set(final_bins.values()):
-        bin_files[c].close()
+        contigs_index.close()
 
     for b in range(len(bins)):
         for contig in bins[b]:
@@ -204,15 +199,13 @@ def write_output(
         for row in output_bins:
             output_writer.writerow(row)
 
-    logger.info(f"Final binning results can be found in {output_bins_path}")
+    if table_only:
+        logger.info(f"Final binning results can be found at {output_file}")
+    else:
+        logger.info(f"Final binning results can be found in {output_bins_path}")
 
-    unbinned_contigs = []
-
-    for i in range(node_count):
-        if i in remove_labels or i not in non_isolated:
-            line = []
-            line.append(contig_names[i])
-            unbinned_contigs.append(line)
+    # Contigs whose labels were removed or that are isolated are unbinned
+    unbinned_contigs = np.flatnonzero(removed | ~non_isolated)
 
     if len(unbinned_contigs) != 0:
         unbinned_file = f"{output_path}{prefix}graphbin_unbinned.csv"
@@ -222,17 +215,38 @@ def write_output(
                 out_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL
             )
 
-            for row in unbinned_contigs:
-                output_writer.writerow(row)
+            output_writer.writerows(
+                [contig_names[i]] for i in unbinned_contigs.tolist()
+            )
 
         logger.info(f"Unbinned contigs can be found at {unbinned_file}")
 
+    if columnar:
+        columnar_file = f"{output_path}{prefix}graphbin_output.npz"
+
+        write_columnar_output(
+            columnar_file,
+            [contig_names[i] for i in range(node_count)],
+            bins_list,
+            initial_bins,
+            bins,
+            removed,
+            non_isolated,
+            scores,
+        )
+
+        logger.info(f"Columnar binning results can be found at {columnar_file}")
+
 
 def get_contig_descriptions(contigs_file):
     contig_descriptions = {}
 
-    for label, _ in MinimalFastaParser(contigs_file):
+    contigs_index = FastaIndex(contigs_file)
+
+    for label in contigs_index.labels:
         name = label.split()[0]
         contig_descriptions[name] = label
 
+    contigs_index.close()
+
     return contig_descriptions
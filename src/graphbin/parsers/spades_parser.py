@@ -2,17 +2,27 @@
 
 import csv
 import logging
-import os
 import re
-import subprocess
 import sys
 
+from array import array
 from collections import defaultdict
 
-from cogent3.parse.fasta import MinimalFastaParser
+import numpy as np
+
 from igraph import *
 
 from graphbin.bidirectionalmap.bidirectionalmap import BidirectionalMap
+from graphbin.parsers import (
+    get_coverage,
+    get_gfa_path,
+    get_segment_contigs_index,
+    read_initial_binning,
+    write_columnar_output,
+)
+from graphbin.parsers.bin_fasta import write_bins
+from graphbin.parsers.fasta import read_fasta_headers
+from graphbin.parsers.fasta_index import FastaIndex
 
 
 __author__ = "Vijini Mallawaarachchi"
@@ -29,117 +39,205 @@ logger = logging.getLogger(f"GraphBin {__version__}")
 
 
 def get_initial_binning_result(
-    n_bins, bins_list, contig_bins_file, contigs_map_rev, delimiter
+    contig_bins_file, contigs_map_rev, node_count, delimiter
 ):
-    logger.info("Obtaining the initial binning result")
+    def get_contig_num(contig_name):
+        start = "NODE_"
+        end = "_length_"
+        return contigs_map_rev[
+            int(re.search("%s(.*)%s" % (start, end), contig_name).group(1))
+        ]
+
+    return read_initial_binning(contig_bins_file, delimiter, node_count, get_contig_num)
+
+
+def read_contig_paths(contig_paths, segment_ids):
+    # Yield the name and the segment IDs of each path in the contigs.paths file.
+    # Paths split over several lines end with ";" on all but the last line
+    with open(contig_paths) as file:
+        for name in file:
+            segments = array("l")
+            path_complete = False
+
+            for path in file:
+                path = path.rstrip()
+                path_complete = not path.endswith(";")
+
+                if not path_complete:
+                    path = path[:-1]
+
+                for segment in path.split(","):
+                    segments.append(segment_ids.setdefault(segment, len(segment_ids)))
+
+                if path_complete:
+                    break
+
+            if path_complete:
+                yield name, segments
+
+
+def get_gfa_contig_paths(gfa_paths, segment_ids):
+    # Yield the contig paths given as GFA P or W lines like read_contig_paths.
+    # SPAdes writes each part of a scaffold path between gaps as a P line named
+    # <contig name>_<n>, and the reverse path of a contig is not written
+    contig_paths = []
+
+    for name, segments in gfa_paths:
+        match = re.match("(NODE_.*_cov_[0-9.]+)_[0-9]+$", name)
+        if match is not None:
+            name = match.group(1)
+
+        if len(contig_paths) > 0 and contig_paths[-1][0] == name:
+            contig_paths[-1][1].extend(segments)
+        else:
+            contig_paths.append((name, list(segments)))
+
+    for name, segments in contig_paths:
+        reverse_segments = [
+            segment[:-1] + ("-" if segment.endswith("+") else "+")
+            for segment in reversed(segments)
+        ]
+
+        for path_name, path in [(name, segments), (name + "'", reverse_segments)]:
+            yield path_name, array(
+                "l",
+                [segment_ids.setdefault(segment, len(segment_ids)) for segment in path],
+            )
 
-    bins = [[] for x in range(n_bins)]
 
+def check_gfa_contig_names(contig_names, contigs_file):
+    # SPAdes writes the scaffold paths as P lines, so their names only match the
+    # contigs file if it has the scaffolds (scaffolds.fasta)
     try:
-        with open(contig_bins_file) as contig_bins:
-            readCSV = csv.reader(contig_bins, delimiter=delimiter)
-            for row in readCSV:
-                start = "NODE_"
-                end = "_length_"
-                contig_num = contigs_map_rev[
-                    int(re.search("%s(.*)%s" % (start, end), row[0]).group(1))
-                ]
-
-                bin_num = bins_list.index(row[1])
-                bins[bin_num].append(contig_num)
+        labels = set(read_fasta_headers(contigs_file))
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
         logger.error(
-            "Please make sure that you have provided the correct assembler type and the correct path to the binning result file in the correct format."
+            "Please make sure that the correct path to the contigs file is provided."
         )
         logger.info("Exiting GraphBin... Bye...!")
         sys.exit(1)
 
-    return bins
+    if labels != set(contig_names.values()):
+        logger.error(
+            f"The paths in the assembly graph file do not match the contigs in {contigs_file}."
+        )
+        logger.error(
+            "The assembly graph has the paths of the scaffolds. Please provide scaffolds.fasta and the initial binning result of the scaffolds, or the contigs.paths file."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
 
 
-def parse_graph(assembly_graph_file, contig_paths):
-    paths = {}
-    segment_contigs = {}
+def parse_graph(assembly_graph_file, contig_paths=None, contigs_file=None):
     node_count = 0
 
     contig_names = BidirectionalMap()
 
     my_map = BidirectionalMap()
 
+    coverages = array("d")
+
     current_contig_num = ""
 
-    try:
-        with open(contig_paths) as file:
-            name = file.readline()
-            path = file.readline()
+    # First and last segments of the path of each contig
+    segment_ids = {}
+    path_starts = array("l")
+    path_ends = array("l")
 
-            while name != "" and path != "":
-                while ";" in path:
-                    path = path[:-2] + "," + file.readline()
+    # Segments of all paths and the contigs they belong to
+    path_segments = array("l")
+    path_contigs = array("l")
 
-                start = "NODE_"
-                end = "_length_"
-                contig_num = str(
-                    int(re.search("%s(.*)%s" % (start, end), name).group(1))
-                )
+    links_map = defaultdict(set)
 
-                segments = path.rstrip().split(",")
+    # Paths given as P or W lines of the assembly graph
+    gfa_paths = []
 
-                if current_contig_num != contig_num:
-                    my_map[node_count] = int(contig_num)
-                    current_contig_num = contig_num
-                    contig_names[node_count] = name.strip()
-                    node_count += 1
+    try:
+        # Get links (and paths if there is no contigs.paths file) from
+        # assembly_graph_with_scaffolds.gfa
+        with open(assembly_graph_file) as file:
+            for line in file:
+                # Identify lines with link information
+                if line.startswith("L"):
+                    strings = line.strip().split("\t")
+                    f1, f2 = strings[1] + strings[2], strings[3] + strings[4]
+                    links_map[f1].add(f2)
+                    links_map[f2].add(f1)
 
-                if contig_num not in paths:
-                    paths[contig_num] = [segments[0], segments[-1]]
+                elif contig_paths is None and line.startswith(("P", "W")):
+                    gfa_paths.append(get_gfa_path(line))
 
-                for segment in segments:
-                    if segment not in segment_contigs:
-                        segment_contigs[segment] = set([contig_num])
-                    else:
-                        segment_contigs[segment].add(contig_num)
+    except BaseException as err:
+        logger.error(f"Unexpected {err}")
+        logger.error(
+            "Please make sure that the correct path to the assembly graph file is provided."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
 
-                name = file.readline()
-                path = file.readline()
+    if contig_paths is None and len(gfa_paths) == 0:
+        logger.error(
+            "The assembly graph does not contain contig paths. Please make sure to provide the path to the contigs.paths file."
+        )
+        logger.info("Exiting GraphBin... Bye...!")
+        sys.exit(1)
+
+    try:
+        if contig_paths is None:
+            path_records = get_gfa_contig_paths(gfa_paths, segment_ids)
+        else:
+            path_records = read_contig_paths(contig_paths, segment_ids)
+
+        for name, segments in path_records:
+            start = "NODE_"
+            end = "_length_"
+            contig_num = str(int(re.search("%s(.*)%s" % (start, end), name).group(1)))
+
+            if current_contig_num != contig_num:
+                my_map[node_count] = int(contig_num)
+                current_contig_num = contig_num
+                contig_names[node_count] = name.strip()
+                coverages.append(get_coverage(name))
+                path_starts.append(segments[0])
+                path_ends.append(segments[-1])
+                node_count += 1
+
+            path_segments.extend(segments)
+            path_contigs.extend([node_count - 1] * len(segments))
+
+        segment_names = list(segment_ids)
+
+        # Contigs of each segment as a CSR index over segment IDs
+        segment_starts, segment_contig_ids = get_segment_contigs_index(
+            path_segments, path_contigs, len(segment_names), node_count
+        )
+
+        del path_segments, path_contigs
 
     except BaseException as err:
         logger.error(f"Unexpected {err}")
         logger.error(
             "Please make sure that the correct path to the contig paths file is provided."
+            if contig_paths is not None
+            else "Please make sure that the paths in the assembly graph file are in the correct format."
         )
         logger.info("Exiting GraphBin... Bye...!")
         sys.exit(1)
 
+    if contig_paths is None and contigs_file is not None:
+        check_gfa_contig_names(contig_names, contigs_file)
+
     contigs_map = my_map
-    contigs_map_rev = my_map.inverse
 
     logger.info(f"Total number of contigs available: {node_count}")
 
-    links = []
-    links_map = defaultdict(set)
-
     ## Construct the assembly graph
     # -------------------------------
 
     try:
-        # Get links from assembly_graph_with_scaffolds.gfa
-        with open(assembly_graph_file) as file:
-            for line in file.readlines():
-                line = line.strip()
-
-                # Identify lines with link information
-                if line.startswith("L"):
-                    strings = line.split("\t")
-                    f1, f2 = strings[1] + strings[2], strings[3] + strings[4]
-                    links_map[f1].add(f2)
-                    links_map[f2].add(f1)
-                    links.append(
-                        strings[1] + strings[2] + " " + strings[3] + strings[4]
-                    )
-
         # Create graph
         assembly_graph = Graph()
 
@@ -150,14 +248,13 @@ def parse_graph(assembly_graph_file, contig_paths):
         edge_list = []
 
         # Name vertices
-        for i in range(node_count):
-            assembly_graph.vs[i]["id"] = i
-            assembly_graph.vs[i]["label"] = str(contigs_map[i])
+        assembly_graph.vs["id"] = list(range(node_count))
+        assembly_graph.vs["label"] = [str(contigs_map[i]) for i in range(node_count)]
 
-        for i in range(len(paths)):
-            segments = paths[str(contigs_map[i])]
+        assembly_graph.vs["coverage"] = coverages
 
-            start = segments[0]
+        for i in range(node_count):
+            start = segment_names[path_starts[i]]
             start_rev = ""
 
             if start.endswith("+"):
@@ -165,7 +262,7 @@ def parse_graph(assembly_graph_file, contig_paths):
             else:
                 start_rev = start[:-1] + "+"
 
-            end = segments[1]
+            end = segment_names[path_ends[i]]
             end_rev = ""
 
             if end.endswith("+"):
@@ -185,11 +282,15 @@ def parse_graph(assembly_graph_file, contig_paths):
                 new_links.extend(list(links_map[end_rev]))
 
             for new_link in new_links:
-                if new_link in segment_contigs:
-                    for contig in segment_contigs[new_link]:
-                        if i != contigs_map_rev[int(contig)]:
+                if new_link in segment_ids:
+                    segment_id = segment_ids[new_link]
+
+                    for contig in segment_contig_ids[
+                        segment_starts[segment_id] : segment_starts[segment_id + 1]
+                    ]:
+                        if i != contig:
                             # Add edge to list of edges
-                            edge_list.append((i, contigs_map_rev[int(contig)]))
+                            edge_list.append((i, contig))
 
         # Add edges to the graph
         assembly_graph.add_edges(edge_list)
@@ -219,8 +320,14 @@ def write_output(
     bins_list,
     delimiter,
     node_count,
-    remove_labels,
+    removed,
     non_isolated,
+    initial_bins=None,
+    scores=None,
+    columnar=False,
+    table_only=False,
+    bin_layout="files",
+    compress_bins=False,
 ):
     logger.info("Writing the Final Binning result to file")
 
@@ -228,26 +335,31 @@ def write_output(
 
     output_bins_path = f"{output_path}{prefix}bins/"
     output_file = f"{output_path}{prefix}graphbin_output.csv"
+    output_stats_file = f"{output_path}{prefix}graphbin_bin_stats.tsv"
 
-    if not os.path.isdir(output_bins_path):
-        subprocess.run(f"mkdir -p {output_bins_path}", shell=True)
+    if not table_only:
+        contigs_index = FastaIndex(contigs_file)
 
-    bin_files = {}
+        # Records of the contigs of each bin, in the order of the contigs file
+        bin_records = defaultdict(list)
 
-    for bin_name in set(final_bins.values()):
-        bin_files[bin_name] = open(
-            f"{output_bins_path}{prefix}bin_{bin_name}.fasta", "w+"
-        )
+        for record, label in enumerate(contigs_index.labels):
+            contig_num = contig_names_rev[label]
 
-    for label, seq in MinimalFastaParser(contigs_file):
-        contig_num = contig_names_rev[label]
+            if contig_num in final_bins:
+                bin_records[final_bins[contig_num]].append((record, label))
 
-        if contig_num in final_bins:
-            bin_files[final_bins[contig_num]].write(f">{label}\n{seq}\n")
+        write_bins(
+            contigs_index,
+            bin_records,
+            output_bins_path,
+            prefix,
+            bin_layout,
+            compress_bins,
+            output_stats_file,
+        )
 
-    # Close output files
-    for c in set(final_bins.values()):
-        bin_files[c].close()
+        contigs_index.close()
 
     for b in range(len(bins)):
         for contig in bins[b]:
@@ -263,15 +375,13 @@ def write_output(
         for row in output_bins:
             output_writer.writerow(row)
 
-    logger.info(f"Final binning results can be found in {output_bins_path}")
+    if table_only:
+        logger.info(f"Final binning results can be found at {output_file}")
+    else:
+        logger.info(f"Final binning results can be found in {output_bins_path}")
 
-    unbinned_contigs = []
-
-    for i in range(node_count):
-        if i in remove_labels or i not in non_isolated:
-            line = []
-            line.append(contig_names[i])
-            unbinned_contigs.append(line)
+    # Contigs whose labels were removed or that are isolated are unbinned
+    unbinned_contigs = np.flatnonzero(removed | ~non_isolated)
 
     if len(unbinned_contigs) != 0:
         unbinned_file = f"{output_path}{prefix}graphbin_unbinned.csv"
@@ -281,7 +391,24 @@ def write_output(
                 out_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL
             )
 
-            for row in unbinned_contigs:
-                output_writer.writerow(row)
+            output_writer.writerows(
+                [contig_names[i]] for i in unbinned_contigs.tolist()
+            )
 
         logger.info(f"Unbinned contigs can be found at {unbinned_file}")
+
+    if columnar:
+        columnar_file = f"{output_path}{prefix}graphbin_output.npz"
+
+        write_columnar_output(
+            columnar_file,
+            [contig_names[i] for i in range(node_count)],
+            bins_list,
+            initial_bins,
+            bins,
+            removed,
+            non_isolated,
+            scores,
+        )
+
+        logger.info(f"Columnar binning results can be found at {columnar_file}")
@@ -15,7 +15,7 @@ import os
 import subprocess
 import sys
 
-from cogent3.parse.fasta import MinimalFastaParser
+from graphbin.parsers.fasta import read_fasta_headers
 
 
 __author__ = "Vijini Mallawaarachchi"
@@ -160,7 +160,7 @@ contig_bins = []
 
 for bin_file in files:
     if bin_file.lower().endswith((".fasta", ".fa", ".fna")):
-        for contig_name, _ in MinimalFastaParser(contig_bins_folder + bin_file):
+        for contig_name in read_fasta_headers(contig_bins_folder + bin_file):
             line = [contig_name, str(bin_file)]
             contig_bins.append(line)
 
@@ -18,7 +18,7 @@ import subprocess
 import sys
 
 from graphbin.bidirectionalmap.bidirectionalmap import BidirectionalMap
-from cogent3.parse.fasta import MinimalFastaParser
+from graphbin.parsers.fasta import read_fasta_records
 from igraph import *
 
 
@@ -214,7 +214,7 @@ print("\nConstructing the assembly graph...")
 original_contigs = {}
 contig_descriptions = {}
 
-for label, seq in MinimalFastaParser(contigs_file):
+for label, seq in read_fasta_records(contigs_file):
     name = label.split()[0]
     original_contigs[name] = seq
     contig_descriptions[name] = label
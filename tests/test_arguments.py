@@ -30,6 +30,16 @@ def workingdir(tmp_dir, monkeypatch):
     monkeypatch.chdir(tmp_dir)
 
 
+def make_inputs(tmp_dir):
+    """write placeholder input files that pass the file checks of the options"""
+    inputs = []
+    for name in ["graph.gfa", "contigs.fasta", "contigs.paths", "initial.csv"]:
+        path = tmp_dir / name
+        path.write("")
+        inputs.append(path)
+    return inputs
+
+
 def exec_wrong_command(cmnd, stdout=subprocess.PIPE, stderr=subprocess.PIPE):
     proc = subprocess.Popen(cmnd, shell=True, stdout=stdout, stderr=stderr)
     out, err = proc.communicate()
@@ -167,3 +177,52 @@ def test_graphbin_diff_threshold(tmp_dir):
     diff_threshold = -10
     cmd = f"graphbin --assembler spades --graph {graph} --contigs {contigs} --paths {paths} --binned {binned} --output {tmp_dir} --max_iteration {diff_threshold}"
     exec_wrong_command(cmd)
+
+
+def test_graphbin_resume_without_checkpoint(tmp_dir):
+    """test graphbin resume without a checkpoint file"""
+    graph, contigs, paths, binned = make_inputs(tmp_dir)
+    cmd = f"graphbin --assembler spades --graph {graph} --contigs {contigs} --paths {paths} --binned {binned} --output {tmp_dir}/ --resume"
+    proc = subprocess.run(cmd, shell=True, capture_output=True)
+    assert proc.returncode == 1
+    assert b"Please provide the checkpoint file to resume from." in proc.stderr
+
+
+def test_graphbin_nthreads(tmp_dir):
+    """test graphbin with wrong nthreads"""
+    graph, contigs, paths, binned = make_inputs(tmp_dir)
+    cmd = f"graphbin --assembler spades --graph {graph} --contigs {contigs} --paths {paths} --binned {binned} --output {tmp_dir}/ --components --nthreads 0"
+    proc = subprocess.run(cmd, shell=True, capture_output=True)
+    assert proc.returncode == 1
+    assert b"Please enter a valid number for nthreads" in proc.stderr
+
+
+def test_graphbin_components_checkpoint(tmp_dir):
+    """test graphbin with a checkpoint file and components"""
+    graph, contigs, paths, binned = make_inputs(tmp_dir)
+    checkpoint = tmp_dir / "graphbin.ckpt"
+    cmd = f"graphbin --assembler spades --graph {graph} --contigs {contigs} --paths {paths} --binned {binned} --output {tmp_dir}/ --components --checkpoint {checkpoint}"
+    proc = subprocess.run(cmd, shell=True, capture_output=True)
+    assert proc.returncode == 1
+    assert (
+        b"Checkpoints cannot be used when running label propagation on each connected component."
+        in proc.stderr
+    )
+
+
+def test_graphbin_cli_lazy_imports(tmp_dir):
+    """test that the graphbin cli does not import the assembler runners"""
+    cmd = "python -c \"import sys, graphbin.cli; assert 'igraph' not in sys.modules\""
+    proc = subprocess.run(cmd, shell=True)
+    assert proc.returncode == 0
+
+
+def test_graphbin_extract_unknown_bin(tmp_dir):
+    """test graphbin extract on a bin that is not in the binning result"""
+    contigs = tmp_dir / "contigs.fasta"
+    contigs.write(">contig_1\nACGT\n")
+    binned = tmp_dir / "graphbin_output.csv"
+    binned.write("contig_1,bin_1\n")
+    cmd = f"graphbin extract --contigs {contigs} --binned {binned} --output {tmp_dir}/ --bins bin_2"
+    proc = subprocess.run(cmd, shell=True, capture_output=True)
+    assert proc.returncode == 1
@@ -0,0 +1,74 @@
+import subprocess
+
+from graphbin.graphbin_extract import extract_bins, read_binning_result
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Gavin Huttley"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Development"
+
+
+def write_inputs(tmp_path):
+    contigs_file = tmp_path / "contigs.fasta"
+    contigs_file.write_text(
+        ">k99_1 flag=1 multi=2.0\nACGT\n>k99_2 flag=1\nGG\nTT\n>k99_3\nCCC\n"
+    )
+
+    binning_file = tmp_path / "graphbin_output.csv"
+    binning_file.write_text("k99_1,bin_a\nk99_2 flag=1,bin_b\nk99_3,bin_a\n")
+
+    return contigs_file, binning_file
+
+
+def test_extract_bins(tmp_path):
+    """test writing the .fasta files of chosen bins from a binning result"""
+    contigs_file, binning_file = write_inputs(tmp_path)
+
+    contig_bins = read_binning_result(str(binning_file), ",")
+    output_bins_path = f"{tmp_path}/bins/"
+
+    n_contigs = extract_bins(
+        str(contigs_file), contig_bins, output_bins_path, "", ["bin_a"]
+    )
+
+    assert n_contigs == 2
+    assert (tmp_path / "bins" / "bin_bin_a.fasta").read_text() == (
+        ">k99_1\nACGT\n>k99_3\nCCC\n"
+    )
+    assert not (tmp_path / "bins" / "bin_bin_b.fasta").exists()
+
+
+def test_graphbin_extract(tmp_path):
+    """test writing the .fasta files of all bins with graphbin extract"""
+    contigs_file, binning_file = write_inputs(tmp_path)
+
+    cmd = f"graphbin extract --contigs {contigs_file} --binned {binning_file} --output {tmp_path}/ --prefix sample"
+    proc = subprocess.run(cmd, shell=True, capture_output=True)
+
+    assert proc.returncode == 0
+    assert (tmp_path / "sample_bins" / "sample_bin_bin_b.fasta").read_text() == (
+        ">k99_2\nGGTT\n"
+    )
+    assert (tmp_path / "sample_bins" / "sample_bin_bin_a.fasta").is_file()
+
+
+def test_graphbin_extract_keeps_run_stats(tmp_path):
+    """test that graphbin extract does not overwrite the bin statistics of the run"""
+    contigs_file, binning_file = write_inputs(tmp_path)
+
+    run_stats_file = tmp_path / "graphbin_bin_stats.tsv"
+    run_stats_file.write_text("bin\tcontigs\ttotal_length\tN50\tGC\n")
+
+    cmd = f"graphbin extract --contigs {contigs_file} --binned {binning_file} --output {tmp_path}/ --bins bin_b"
+    proc = subprocess.run(cmd, shell=True, capture_output=True)
+
+    assert proc.returncode == 0
+    assert run_stats_file.read_text() == "bin\tcontigs\ttotal_length\tN50\tGC\n"
+    assert (tmp_path / "graphbin_extract_bin_stats.tsv").read_text() == (
+        "bin\tcontigs\ttotal_length\tN50\tGC\nbin_b\t1\t4\t4\t0.5000\n"
+    )
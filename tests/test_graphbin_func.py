@@ -0,0 +1,123 @@
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from igraph import Graph
+
+from graphbin.graphbin_Func import (
+    MIN_BIN_COUNT,
+    get_removable_vertices,
+    graphbin_main,
+    remove_ambiguous_labels,
+)
+from graphbin.labelpropagation.labelprop import LabelProp
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Gavin Huttley"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Development"
+
+
+def test_removable_vertices_keep_min_bin_count():
+    """test that a bin keeps min_bin_count - 1 vertices after removal"""
+    candidates = [7, 3, 5, 1]
+
+    assert get_removable_vertices(candidates, 12, 0, 10) == [7, 3, 5]
+    assert get_removable_vertices(candidates, 12, 2, 10) == [7]
+    assert get_removable_vertices(candidates, 9, 0, 10) == []
+    assert get_removable_vertices(candidates, 4, 0, 1) == candidates
+
+
+def test_removable_vertices_ranked():
+    """test that ranked removal does not depend on the order of candidates"""
+    removable = get_removable_vertices([7, 3, 5, 1], 12, 0, 10, "ranked")
+
+    assert removable == [1, 3, 5]
+    assert get_removable_vertices([5, 1, 7, 3], 12, 0, 10, "ranked") == removable
+
+
+def test_removable_vertices_ranked_conflicts():
+    """test that ranked removal removes vertices with most conflicts first"""
+    conflicts = {1: 1, 3: 2, 5: 1, 7: 3}
+    removable = get_removable_vertices([1, 3, 5, 7], 12, 0, 10, "ranked", conflicts)
+
+    assert removable == [7, 3, 1]
+    assert (
+        get_removable_vertices([5, 1, 7, 3], 12, 0, 10, "ranked", conflicts)
+        == removable
+    )
+
+
+def test_graphbin_main_components_broken_pool(monkeypatch):
+    """test that a crashed label propagation process exits GraphBin"""
+    graph = Graph(n=4, edges=[(0, 1), (1, 2), (2, 3)])
+
+    def crash(self, *args, **kwargs):
+        raise BrokenProcessPool("worker crashed")
+
+    monkeypatch.setattr(LabelProp, "run_components", crash)
+
+    with pytest.raises(SystemExit):
+        graphbin_main(
+            2, [[0], [3]], ["1", "2"], graph, 4, 0.1, 100, components=True, nthreads=2
+        )
+
+
+def sequential_remove_ambiguous_labels(graph, bins, min_bin_count):
+    """final ambiguous vertex removal pass with membership scans of the bins"""
+    bins = [list(members) for members in bins]
+    remove_by_bin = {}
+    remove_labels = []
+
+    for b in range(len(bins)):
+        for i in bins[b]:
+            neighbours_have_same_label = True
+
+            for neighbour in graph.neighbors(i, mode="all"):
+                for k in range(len(bins)):
+                    if neighbour in bins[k] and k != b:
+                        neighbours_have_same_label = False
+                        break
+
+            if not neighbours_have_same_label:
+                n_removed = len(remove_by_bin.get(b, []))
+                if len(bins[b]) - n_removed >= min_bin_count:
+                    remove_labels.append(i)
+                    remove_by_bin.setdefault(b, []).append(i)
+
+    for i in remove_labels:
+        for n in range(len(bins)):
+            if i in bins[n]:
+                bins[n].remove(i)
+
+    return remove_labels, bins
+
+
+def test_remove_ambiguous_labels_sequential():
+    """test that the vectorised final pass matches the sequential pass"""
+    rng = np.random.default_rng(7)
+    node_count = 80
+    graph = Graph(n=node_count, edges=rng.integers(node_count, size=(160, 2)).tolist())
+
+    # Bins of several sizes, including bins at and next to MIN_BIN_COUNT
+    vertices = rng.permutation(node_count)
+    sizes = [MIN_BIN_COUNT - 1, MIN_BIN_COUNT, MIN_BIN_COUNT + 1, 25, 15]
+    bin_starts = np.cumsum([0] + sizes)
+    bins = [vertices[bin_starts[b] : bin_starts[b + 1]] for b in range(len(sizes))]
+
+    expected_labels, expected_bins = sequential_remove_ambiguous_labels(
+        graph, bins, MIN_BIN_COUNT
+    )
+
+    edges = np.array(graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    removed = remove_ambiguous_labels(edges, bins, node_count)
+
+    assert expected_labels
+    assert sorted(expected_labels) == np.flatnonzero(removed).tolist()
+    assert [members.tolist() for members in bins] == expected_bins
@@ -0,0 +1,304 @@
+import pickle
+
+from pathlib import Path
+
+import pytest
+
+from graphbin.labelpropagation import labelprop
+from graphbin.labelpropagation.labelprop import LabelProp
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Gavin Huttley"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Development"
+
+
+@pytest.fixture(scope="session")
+def tmp_dir(tmpdir_factory):
+    return tmpdir_factory.mktemp("tmp")
+
+
+def chain_data(length=12):
+    """two labelled ends of a chain with unlabelled vertices in between"""
+    data = []
+    for v in range(length):
+        label = 0
+        if v == 0:
+            label = 1
+        elif v == length - 1:
+            label = 2
+        neighbours = [[n, 1.0] for n in (v - 1, v + 1) if 0 <= n < length]
+        data.append([v, label, neighbours])
+    return data
+
+
+def run_lp(data, eps=0.0001, max_iter=100, **kwargs):
+    lp = LabelProp()
+    lp.load_data_from_mem(data)
+    return lp.run(eps, max_iter, **kwargs)
+
+
+def test_labelprop_labels():
+    """test label propagation on a chain"""
+    ans = {line[0]: line[1] for line in run_lp(chain_data())}
+    assert ans[1] == 1
+    assert ans[10] == 2
+
+
+def test_labelprop_resume(tmp_dir):
+    """test resuming label propagation from a checkpoint"""
+    checkpoint = str(Path(tmp_dir) / "resume.ckpt")
+    expected = run_lp(chain_data())
+
+    run_lp(chain_data(), max_iter=5, checkpoint_file=checkpoint, checkpoint_interval=2)
+    got = run_lp(chain_data(), checkpoint_file=checkpoint, resume=True)
+
+    assert got == expected
+
+
+def test_labelprop_resume_other_graph(tmp_dir):
+    """test resuming from a checkpoint of a different graph"""
+    checkpoint = str(Path(tmp_dir) / "other.ckpt")
+    run_lp(chain_data(), max_iter=5, checkpoint_file=checkpoint)
+
+    with pytest.raises(SystemExit):
+        run_lp(chain_data(15), checkpoint_file=checkpoint, resume=True)
+
+
+def test_labelprop_resume_corrupt_checkpoint(tmp_dir):
+    """test resuming from a checkpoint file that is not a checkpoint"""
+    checkpoint = Path(tmp_dir) / "corrupt.ckpt"
+    checkpoint.write_bytes(b"not a checkpoint")
+
+    with pytest.raises(SystemExit):
+        run_lp(chain_data(), checkpoint_file=str(checkpoint), resume=True)
+
+
+loaded_pickles = []
+
+
+class PickledCall:
+    """object that records being unpickled"""
+
+    def __reduce__(self):
+        return (loaded_pickles.append, ("loaded",))
+
+
+def test_labelprop_resume_pickle_checkpoint(tmp_dir):
+    """test that checkpoint files are never unpickled"""
+    checkpoint = Path(tmp_dir) / "pickled.ckpt"
+    checkpoint.write_bytes(pickle.dumps(PickledCall()))
+
+    with pytest.raises(SystemExit):
+        run_lp(chain_data(), checkpoint_file=str(checkpoint), resume=True)
+
+    assert loaded_pickles == []
+
+
+@pytest.mark.parametrize("f_storage", ["dense", "float32", "sparse"])
+def test_labelprop_resume_f_storage(tmp_dir, f_storage):
+    """test resuming label propagation with each storage of F"""
+    checkpoint = str(Path(tmp_dir) / f"resume_{f_storage}.ckpt")
+    expected = run_lp(chain_data())
+
+    lp = LabelProp(f_storage=f_storage)
+    lp.load_data_from_mem(chain_data())
+    lp.run(0.0001, 5, checkpoint_file=checkpoint)
+
+    lp = LabelProp(f_storage=f_storage)
+    lp.load_data_from_mem(chain_data())
+    got = lp.run(0.0001, 100, checkpoint_file=checkpoint, resume=True)
+
+    assert [line[:2] for line in got] == [line[:2] for line in expected]
+
+
+def test_labelprop_resume_sparse_rows(tmp_dir, monkeypatch):
+    """test that the F rows of a sparse checkpoint stay sparse when resuming"""
+    checkpoint = str(Path(tmp_dir) / "sparse_rows.ckpt")
+
+    lp = LabelProp(f_storage="sparse")
+    lp.load_data_from_mem(chain_data(), labels=range(1000))
+    lp.run(0.0001, 5, checkpoint_file=checkpoint)
+    saved = dict(lp.vertex_f_map)
+
+    def expand(*args):
+        raise AssertionError("F rows were expanded to all labels")
+
+    lp = LabelProp(f_storage="sparse")
+    lp.load_data_from_mem(chain_data(), labels=range(1000))
+    monkeypatch.setattr(LabelProp, "to_f_storage", expand)
+    monkeypatch.setattr(LabelProp, "get_f_values", expand)
+    lp.load_checkpoint(checkpoint)
+    lp.warm_start(checkpoint)
+
+    assert all(type(arr) is dict for arr in lp.vertex_f_map.values())
+    assert lp.vertex_f_map == saved
+
+
+@pytest.mark.parametrize(
+    "saved_storage, f_storage", [("sparse", "dense"), ("dense", "sparse")]
+)
+def test_labelprop_warm_start_f_storage(tmp_dir, saved_storage, f_storage):
+    """test seeding label propagation from a checkpoint of another storage of F"""
+    checkpoint = str(Path(tmp_dir) / f"warm_{saved_storage}.ckpt")
+
+    lp = LabelProp(f_storage=saved_storage)
+    lp.load_data_from_mem(chain_data())
+    lp.run(0.0001, 5, checkpoint_file=checkpoint)
+
+    lp = LabelProp(f_storage=f_storage)
+    lp.load_data_from_mem(chain_data())
+    ans = lp.run(0.0001, 100, warm_start_file=checkpoint)
+
+    assert {line[0]: line[1] for line in ans} == {
+        line[0]: line[1] for line in run_lp(chain_data())
+    }
+
+
+def test_labelprop_resume_other_errors(tmp_dir, monkeypatch):
+    """test that errors not caused by the checkpoint are not reported as such"""
+    checkpoint = str(Path(tmp_dir) / "interrupted.ckpt")
+    run_lp(chain_data(), max_iter=5, checkpoint_file=checkpoint)
+
+    def interrupt(self):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(LabelProp, "iterate", interrupt)
+
+    with pytest.raises(KeyboardInterrupt):
+        run_lp(chain_data(), checkpoint_file=checkpoint, resume=True)
+
+
+def test_labelprop_warm_start(tmp_dir):
+    """test seeding label propagation from a previous result"""
+    checkpoint = str(Path(tmp_dir) / "warm.ckpt")
+    run_lp(chain_data(), checkpoint_file=checkpoint)
+
+    lp = LabelProp()
+    lp.load_data_from_mem(chain_data())
+    ans = lp.run(0.0001, 100, warm_start_file=checkpoint)
+
+    assert {line[0]: line[1] for line in ans} == {
+        line[0]: line[1] for line in run_lp(chain_data())
+    }
+
+
+def test_labelprop_active_set():
+    """test active-set label propagation against full label propagation"""
+    expected = run_lp(chain_data(30))
+
+    lp = LabelProp()
+    lp.load_data_from_mem(chain_data(30))
+    got = lp.run(0.0001, 100, active_set=True, active_tol=0.0)
+
+    assert [line[:2] for line in got] == [line[:2] for line in expected]
+    assert len(lp.frontier_sizes) > 2
+
+    # The first iteration computes all unlabelled vertices, and the second
+    # only the neighbours of the vertices next to the labelled ends
+    assert lp.frontier_sizes[:2] == [28, 2]
+
+
+def test_labelprop_components(monkeypatch):
+    """test label propagation on each connected component in worker processes"""
+    data = chain_data(12)
+    for line in chain_data(20):
+        line[0] += 100
+        line[2] = [[n + 100, w] for n, w in line[2]]
+        if line[1] == 2:
+            line[1] = 3
+        data.append(line)
+
+    monkeypatch.setattr(labelprop, "COMPONENT_BATCH_SIZE", 1)
+
+    lp = LabelProp()
+    lp.load_data_from_mem(data)
+    sequential = lp.run_components(0.0001, 100)
+    parallel = lp.run_components(0.0001, 100, n_jobs=2)
+
+    assert len(lp.get_components()) == 2
+    assert parallel == sequential
+    assert {line[0]: line[1] for line in parallel} == {
+        line[0]: line[1] for line in run_lp(data, eps=0.0)
+    }
+
+
+def test_labelprop_components_empty():
+    """test label propagation on each connected component without vertices"""
+    lp = LabelProp()
+    lp.load_data_from_mem([])
+    vertices, labels, scores = lp.run_components(
+        0.0001, 100, show_log=True, return_arrays=True
+    )
+
+    assert len(vertices) == len(labels) == len(scores) == 0
+
+
+@pytest.mark.parametrize("f_storage", ["float32", "sparse"])
+def test_labelprop_f_storage(f_storage):
+    """test label propagation with compact storage of F"""
+    expected = run_lp(chain_data())
+
+    lp = LabelProp(f_storage=f_storage)
+    lp.load_data_from_mem(chain_data())
+    got = lp.run(0.0001, 100)
+
+    assert [line[:2] for line in got] == [line[:2] for line in expected]
+
+
+def test_labelprop_sparse_top_k():
+    """test that sparse storage keeps only the top-k label weights"""
+    data = chain_data()
+    data[5][1] = 3
+
+    lp = LabelProp(f_storage="sparse", f_top_k=1)
+    lp.load_data_from_mem(data)
+    lp.run(0.0001, 100)
+
+    assert all(len(arr) <= 1 for arr in lp.vertex_f_map.values())
+
+
+def test_labelprop_iteration_stats(tmp_dir):
+    """test convergence diagnostics of label propagation"""
+    lp = LabelProp()
+    lp.load_data_from_mem(chain_data())
+    lp.run(0.0001, 100)
+
+    stats = lp.iteration_stats
+    assert len(stats) == lp.n_iterations
+    assert stats[0]["label_changes"] == 2
+    assert stats[-1]["diff"] == lp.diff
+    assert max(s["max_change"] for s in stats) == 0.5
+
+    stats_file = Path(tmp_dir) / "convergence.tsv"
+    lp.write_iteration_stats(str(stats_file))
+    assert len(stats_file.read_text().splitlines()) == len(stats) + 1
+
+
+def test_labelprop_stable_iterations():
+    """test stopping label propagation once labels stop changing"""
+    expected = run_lp(chain_data())
+
+    lp = LabelProp()
+    lp.load_data_from_mem(chain_data())
+    got = lp.run(0.0, 1000, stable_iterations=3)
+
+    assert lp.n_iterations < 1000
+    assert [s["label_changes"] for s in lp.iteration_stats[-3:]] == [0, 0, 0]
+    assert [line[:2] for line in got] == [line[:2] for line in expected]
+
+
+def test_labelprop_result_arrays():
+    """test the label propagation result as arrays"""
+    expected = run_lp(chain_data())
+
+    vertices, labels, scores = run_lp(chain_data(), return_arrays=True)
+
+    assert vertices.tolist() == [line[0] for line in expected]
+    assert labels.tolist() == [line[1] for line in expected]
+    assert scores.tolist() == [max(f for _, f in line[2:]) for line in expected]
@@ -0,0 +1,465 @@
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+from graphbin.parsers import (
+    get_coverage,
+    get_gfa_path,
+    get_overlap_length,
+    read_gfa_links,
+    read_initial_binning,
+    write_columnar_output,
+)
+from graphbin.parsers.bin_fasta import (
+    get_n50,
+    read_bin,
+    read_bin_index,
+    write_bins,
+)
+from graphbin.parsers.canu_parser import parse_graph as parse_canu_graph
+from graphbin.parsers.fasta import (
+    read_fasta_blocks,
+    read_fasta_headers,
+    read_fasta_offsets,
+    read_fasta_records,
+)
+from graphbin.parsers.fasta_index import FASTA_INDEX_SUFFIX, FastaIndex
+from graphbin.parsers.flye_parser import get_contig_edges
+from graphbin.parsers.flye_parser import parse_graph as parse_flye_graph
+from graphbin.parsers.megahit_parser import parse_graph as parse_megahit_graph
+from graphbin.parsers.sga_parser import parse_graph as parse_sga_graph
+from graphbin.parsers.spades_parser import parse_graph as parse_spades_graph
+from graphbin.parsers.spades_parser import read_contig_paths
+
+
+__author__ = "Vijini Mallawaarachchi"
+__copyright__ = "Copyright 2019-2022, GraphBin Project"
+__credits__ = ["Vijini Mallawaarachchi", "Gavin Huttley"]
+__license__ = "BSD-3"
+__version__ = "1.7.4"
+__maintainer__ = "Vijini Mallawaarachchi"
+__email__ = "viji.mallawaarachchi@gmail.com"
+__status__ = "Development"
+
+
+@pytest.mark.parametrize(
+    "name,coverage",
+    [
+        ("NODE_1_length_488682_cov_86.190505", 86.190505),
+        ("NODE_7_length_120_cov_3.5_ID_13", 3.5),
+        ("contig-1", 0.0),
+    ],
+)
+def test_get_coverage(name, coverage):
+    """test reading the coverage from contig names"""
+    assert get_coverage(name) == coverage
+
+
+@pytest.mark.parametrize(
+    "cigar,length", [("55M", 55), ("0M", 0), ("10M2I5M", 15), ("*", 0)]
+)
+def test_get_overlap_length(cigar, length):
+    """test reading the overlap length of GFA links"""
+    assert get_overlap_length(cigar) == length
+
+
+def test_read_initial_binning(tmp_path):
+    """test streaming the initial binning result into bins"""
+    binning_file = tmp_path / "initial_binning_res.csv"
+    binning_file.write_text("c3,bin_b\nc0,bin_a\nc5,bin_b\nc1,bin_a\nc0,bin_a\n")
+
+    n_bins, bins_list, bins = read_initial_binning(
+        binning_file, ",", 6, lambda name: int(name[1:])
+    )
+
+    assert n_bins == 2
+    assert bins_list == ["bin_a", "bin_b"]
+    assert all(members.dtype == np.int64 for members in bins)
+    assert [members.tolist() for members in bins] == [[0, 1], [3, 5]]
+
+
+def test_read_initial_binning_multiple_bins(tmp_path):
+    """test rejecting contigs that belong to multiple bins"""
+    binning_file = tmp_path / "initial_binning_res.csv"
+    binning_file.write_text("c0,bin_a\nc0,bin_b\n")
+
+    with pytest.raises(SystemExit):
+        read_initial_binning(binning_file, ",", 1, lambda name: int(name[1:]))
+
+
+def test_fasta_index(tmp_path):
+    """test reading sequences through the FASTA index and its cache"""
+    fasta_file = tmp_path / "contigs.fasta"
+    fasta_file.write_text(
+        ">contig_1 len=8\nACGT\nACGT\n>contig_2\nGG TT\r\n\n>contig_3\nC\n"
+    )
+
+    contigs_index = FastaIndex(str(fasta_file))
+
+    assert contigs_index.labels == ["contig_1 len=8", "contig_2", "contig_3"]
+    assert [contigs_index.get_sequence(i) for i in range(len(contigs_index))] == [
+        "ACGTACGT",
+        "GGTT",
+        "C",
+    ]
+    contigs_index.close()
+
+    # The cached index is reused and rebuilt once the file changes
+    assert (tmp_path / f"contigs.fasta{FASTA_INDEX_SUFFIX}").is_file()
+    assert FastaIndex(str(fasta_file)).labels == contigs_index.labels
+
+    fasta_file.write_text(">contig_4\nAAAA\n")
+
+    contigs_index = FastaIndex(str(fasta_file))
+    assert contigs_index.labels == ["contig_4"]
+    assert contigs_index.get_sequence(0) == "AAAA"
+
+
+def test_write_columnar_output(tmp_path):
+    """test writing the binning result of all contigs as NumPy arrays"""
+    output_file = tmp_path / "graphbin_output.npz"
+
+    write_columnar_output(
+        str(output_file),
+        ["c0", "c1", "c2", "c3"],
+        ["bin_a", "bin_b"],
+        np.array([0, -1, 1, 1]),
+        [[0, 1], [3]],
+        np.array([False, False, True, False]),
+        np.array([True, True, True, False]),
+        np.array([1.0, 0.75, 1.0, np.nan]),
+    )
+
+    result = np.load(output_file)
+
+    assert result["contig_index"].tolist() == [0, 1, 2, 3]
+    assert result["contig_name"].tolist() == ["c0", "c1", "c2", "c3"]
+    assert result["bin_names"].tolist() == ["bin_a", "bin_b"]
+    assert result["initial_bin"].tolist() == [0, -1, 1, 1]
+    assert result["final_bin"].tolist() == [0, 0, -1, 1]
+    assert result["removed"].tolist() == [False, False, True, False]
+    assert result["unbinned"].tolist() == [False, False, True, True]
+    assert np.isnan(result["score"][3])
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_read_fasta(tmp_path, compressed):
+    """test reading FASTA headers, offsets and records"""
+    data = b">contig_1 len=8\nACGT\n#comment\nACGT\n>contig_2\nGG TT\r\n\n>contig_3"
+
+    fasta_file = tmp_path / "contigs.fasta"
+    fasta_file.write_bytes(gzip.compress(data) if compressed else data)
+
+    assert list(read_fasta_headers(str(fasta_file))) == [
+        "contig_1 len=8",
+        "contig_2",
+        "contig_3",
+    ]
+    assert list(read_fasta_offsets(str(fasta_file))) == [
+        ("contig_1 len=8", 16, 19),
+        ("contig_2", 45, 8),
+        ("contig_3", 62, 0),
+    ]
+    assert list(read_fasta_records(str(fasta_file))) == [
+        ("contig_1 len=8", "ACGTACGT"),
+        ("contig_2", "GGTT"),
+        ("contig_3", ""),
+    ]
+
+
+def test_read_fasta_blocks_small_buffer():
+    """test that records are read the same when headers span several reads"""
+    data = b">contig_1\nACGTACGT\nAC\n>contig_2 long description\nGGG\n"
+
+    blocks = [
+        (label, offset, size, bytes(sequence))
+        for label, offset, size, sequence in read_fasta_blocks(
+            io.BytesIO(data), buffer_size=3
+        )
+    ]
+
+    assert blocks == [
+        ("contig_1", 10, 12, b"ACGTACGT\nAC\n"),
+        ("contig_2 long description", 49, 4, b"GGG\n"),
+    ]
+
+
+@pytest.mark.parametrize("compress_bins", [False, True])
+def test_write_bins_single_layout(tmp_path, compress_bins):
+    """test writing all bins to one indexed .fasta file and reading single bins"""
+    fasta_file = tmp_path / "contigs.fasta"
+    fasta_file.write_text(">c0\nACGT\n>c1\nGG\n>c2\nTTT\n")
+
+    contigs_index = FastaIndex(str(fasta_file))
+    write_bins(
+        contigs_index,
+        {"bin_b": [(1, "c1")], "bin_a": [(0, "c0"), (2, "c2")]},
+        f"{tmp_path}/bins/",
+        "",
+        "single",
+        compress_bins,
+    )
+    contigs_index.close()
+
+    bins_file = tmp_path / "bins" / ("bins.fasta.gz" if compress_bins else "bins.fasta")
+    bin_index = read_bin_index(f"{bins_file}.idx")
+
+    assert list(bin_index) == ["bin_a", "bin_b"]
+    assert [n_contigs for _, _, n_contigs in bin_index.values()] == [2, 1]
+    assert list(read_bin(str(bins_file), bin_index, "bin_b")) == [("c1", "GG")]
+    assert list(read_bin(str(bins_file), bin_index, "bin_a")) == [
+        ("c0", "ACGT"),
+        ("c2", "TTT"),
+    ]
+
+    # The bins are stored one after another in the order of the index
+    data = bins_file.read_bytes()
+    if compress_bins:
+        data = gzip.decompress(data)
+    assert data == b">c0\nACGT\n>c2\nTTT\n>c1\nGG\n"
+
+
+@pytest.mark.parametrize(
+    "lengths,n50",
+    [([2, 3, 4, 5, 6, 7, 8, 9, 10], 8), ([5, 5], 5), ([100, 1], 100), ([], 0)],
+)
+def test_get_n50(lengths, n50):
+    """test the N50 of contig lengths"""
+    assert get_n50(lengths) == n50
+
+
+def test_write_bins_stats(tmp_path):
+    """test the summary statistics of the bins collected while writing them"""
+    fasta_file = tmp_path / "contigs.fasta"
+    fasta_file.write_text(">c0\nGGCC\nAT\n>c1\nacgtNN\n>c2\nAAAA\n")
+
+    contigs_index = FastaIndex(str(fasta_file))
+    bin_stats = write_bins(
+        contigs_index,
+        {"bin_a": [(0, "c0"), (1, "c1")], "bin_b": [(2, "c2")]},
+        f"{tmp_path}/bins/",
+        "",
+        stats_file=str(tmp_path / "graphbin_bin_stats.tsv"),
+    )
+    contigs_index.close()
+
+    assert bin_stats == [("bin_a", 2, 12, 6, 0.6), ("bin_b", 1, 4, 4, 0.0)]
+    assert (tmp_path / "graphbin_bin_stats.tsv").read_text() == (
+        "bin\tcontigs\ttotal_length\tN50\tGC\n"
+        "bin_a\t2\t12\t6\t0.6000\n"
+        "bin_b\t1\t4\t4\t0.0000\n"
+    )
+
+
+def test_megahit_contig_mapping(tmp_path):
+    """test mapping MEGAHIT graph segments to contigs by sequence"""
+    graph_file = tmp_path / "final.gfa"
+    graph_file.write_text(
+        "S\tNODE_1_length_4_cov_2.0\tAACG\n"
+        "S\tNODE_2_length_4_cov_3.0\tGGGT\n"
+        "L\tNODE_1_length_4_cov_2.0\t+\tNODE_2_length_4_cov_3.0\t+\t3M\n"
+    )
+    contigs_file = tmp_path / "final.contigs.fa"
+    contigs_file.write_text(">k99_2 flag=1\nACCC\n>k99_1 flag=1\nAACG\n")
+
+    contigs_index = FastaIndex(str(contigs_file))
+
+    _, graph_to_contig_map, _, node_count = parse_megahit_graph(
+        str(graph_file), contigs_index
+    )
+
+    assert node_count == 2
+    assert graph_to_contig_map == {1: "k99_1", 2: "k99_2"}
+
+    # The contigs index is left open for the caller
+    assert contigs_index.get_sequence(0) == "ACCC"
+    contigs_index.close()
+
+
+def test_sga_parse_graph(tmp_path):
+    """test reading contigs and edges from an ASQG file"""
+    graph_file = tmp_path / "default-graph.asqg"
+    graph_file.write_text(
+        "HT\tVN:i:1\tER:f:0\tOL:i:45\n"
+        "VT\tcontig-7\tACGTACGT\n"
+        "VT\tcontig-2\tGGGTTT\n"
+        "VT\tcontig-5\tAAAACC\n"
+        "ED\tcontig-7 contig-2 0 44 203 30 74 214 0 0\n"
+        "ED\tcontig-2 contig-2 0 9 6 0 9 6 0 0\n"
+        "ED\tcontig-2 contig-7 30 74 214 0 44 203 0 0\n"
+        "ED\tcontig-5 contig-2 0 19 100 10 29 100 0 0\n"
+    )
+
+    assembly_graph, contigs_map, contig_names, node_count = parse_sga_graph(
+        str(graph_file)
+    )
+
+    assert node_count == 3
+    assert contigs_map == {0: 7, 1: 2, 2: 5}
+    assert contig_names == {0: "contig-7", 1: "contig-2", 2: "contig-5"}
+    assert sorted(assembly_graph.get_edgelist()) == [(0, 1), (1, 2)]
+    assert assembly_graph.es["overlap"] == [45, 20]
+
+
+def test_canu_parse_graph_links_before_segments(tmp_path):
+    """test reading GFA links that appear before their segments"""
+    graph_file = tmp_path / "contigs.gfa"
+    graph_file.write_text(
+        "H\tVN:Z:1.0\n"
+        "L\ttig2\t+\ttig1\t-\t20M\n"
+        "L\ttig1\t+\ttig1\t+\t5M\n"
+        "S\ttig1\t*\tLN:i:201\n"
+        "S\ttig2\t*\tLN:i:141\n"
+        "S\ttig3\t*\tLN:i:242\n"
+        "L\ttig3\t+\ttig2\t+\t7M\n"
+    )
+
+    assembly_graph, contigs_map, node_count = parse_canu_graph(str(graph_file))
+
+    assert node_count == 3
+    assert contigs_map == {0: "tig1", 1: "tig2", 2: "tig3"}
+    assert assembly_graph.get_edgelist() == [(0, 1), (1, 2)]
+    assert assembly_graph.es["overlap"] == [20, 7]
+
+
+def test_read_gfa_links_missing_segment(tmp_path):
+    """test rejecting GFA links to segments that are not in the graph"""
+    graph_file = tmp_path / "reads.gfa"
+    graph_file.write_text("S\tutg1\t*\nL\tutg1\t+\tutg2\t+\t5M\n")
+
+    with pytest.raises(ValueError):
+        read_gfa_links(str(graph_file))
+
+
+def test_read_gfa_links_duplicate_segment(tmp_path):
+    """test rejecting GFA segments with the same name"""
+    graph_file = tmp_path / "reads.gfa"
+    graph_file.write_text("S\tutg1\t*\nS\tutg2\t*\nS\tutg1\t*\n")
+
+    with pytest.raises(ValueError):
+        read_gfa_links(str(graph_file))
+
+    with pytest.raises(SystemExit):
+        parse_canu_graph(str(graph_file))
+
+
+def test_flye_parse_graph(tmp_path):
+    """test reading Flye contig paths and links between their segments"""
+    paths_file = tmp_path / "assembly_info.txt"
+    paths_file.write_text(
+        "#seq_name\tlength\tcov.\tcirc.\trepeat\tmult.\talt_group\tgraph_path\n"
+        "contig_1\t91\t12\tN\tN\t1\t*\t*,1,*\n"
+        "contig_2\t98\t28\tN\tN\t1\t*\t-2,3\n"
+        "contig_3\t241\t41\tN\tN\t1\t*\t4\n"
+        "contig_4\t120\t5\tN\tN\t1\t*\t-3\n"
+    )
+    graph_file = tmp_path / "assembly_graph.gfa"
+    graph_file.write_text(
+        "S\tedge_1\t*\n" "L\tedge_1\t+\tedge_2\t+\t0M\n" "L\tedge_4\t+\tedge_4\t-\t0M\n"
+    )
+
+    assembly_graph, contig_names, node_count = parse_flye_graph(
+        str(graph_file), str(paths_file)
+    )
+
+    assert node_count == 4
+    assert contig_names == {
+        0: "contig_1",
+        1: "contig_2",
+        2: "contig_3",
+        3: "contig_4",
+    }
+    assert assembly_graph.vs["coverage"] == [12.0, 28.0, 41.0, 5.0]
+    assert sorted(assembly_graph.get_edgelist()) == [(0, 1), (1, 3)]
+
+
+def test_flye_get_contig_edges():
+    """test deriving edges between contigs from their segments and links"""
+    segment_ids = {"1": 0, "-2": 1, "3": 2, "-3": 3}
+    path_segments = [0, 1, 2, 3]
+    path_offsets = [0, 1, 3, 4]
+    links_map = {"1": {"2"}, "2": {"1"}}
+
+    edge_list = get_contig_edges(segment_ids, path_segments, path_offsets, links_map)
+
+    assert sorted(set(edge_list)) == [(1, 0), (1, 2), (2, 1)]
+
+
+def test_read_contig_paths(tmp_path):
+    """test joining SPAdes contig paths that continue over several lines"""
+    paths_file = tmp_path / "contigs.paths"
+    paths_file.write_text(
+        "NODE_1_length_100_cov_2.5\n"
+        "4+,7-;\n"
+        "9+;\n"
+        "2+\n"
+        "NODE_1_length_100_cov_2.5'\n"
+        "2-,9-,7+,4-\n"
+    )
+
+    segment_ids = {}
+    paths = [
+        (name.strip(), [list(segment_ids)[i] for i in segments])
+        for name, segments in read_contig_paths(str(paths_file), segment_ids)
+    ]
+
+    assert paths == [
+        ("NODE_1_length_100_cov_2.5", ["4+", "7-", "9+", "2+"]),
+        ("NODE_1_length_100_cov_2.5'", ["2-", "9-", "7+", "4-"]),
+    ]
+
+
+@pytest.mark.parametrize(
+    "line,path",
+    [
+        ("P\tNODE_1_length_9_cov_2.0_1\t4+,7-\t*\n", ["4+", "7-"]),
+        ("W\tsample\t1\tNODE_1_length_9_cov_2.0_1\t0\t9\t>4<7\n", ["4+", "7-"]),
+    ],
+)
+def test_get_gfa_path(line, path):
+    """test reading contig paths from GFA P and W lines"""
+    assert get_gfa_path(line) == ("NODE_1_length_9_cov_2.0_1", path)
+
+
+def test_spades_parse_graph_from_gfa_paths(tmp_path):
+    """test reading SPAdes scaffold paths from the P lines of the assembly graph"""
+    graph_file = tmp_path / "assembly_graph_with_scaffolds.gfa"
+    graph_file.write_text(
+        "S\t1\tACGT\nS\t2\tACGT\nS\t3\tACGT\nS\t4\tACGT\n"
+        "L\t1\t+\t2\t+\t0M\n"
+        "L\t3\t+\t4\t-\t0M\n"
+        "P\tNODE_1_length_8_cov_2.5_1\t1+\t*\n"
+        "P\tNODE_1_length_8_cov_2.5_2\t3+\t*\n"
+        "P\tNODE_2_length_4_cov_4.0_1\t2+\t*\n"
+        "P\tNODE_3_length_4_cov_1.0_1\t4+\t*\n"
+    )
+
+    scaffolds_file = tmp_path / "scaffolds.fasta"
+    scaffolds_file.write_text(
+        ">NODE_1_length_8_cov_2.5\nACGTNNACGT\n"
+        ">NODE_2_length_4_cov_4.0\nACGT\n"
+        ">NODE_3_length_4_cov_1.0\nACGT\n"
+    )
+    contigs_file = tmp_path / "contigs.fasta"
+    contigs_file.write_text(
+        ">NODE_1_length_4_cov_2.5\nACGT\n"
+        ">NODE_2_length_4_cov_2.5\nACGT\n"
+        ">NODE_3_length_4_cov_4.0\nACGT\n"
+        ">NODE_4_length_4_cov_1.0\nACGT\n"
+    )
+
+    assembly_graph, contigs_map, contig_names, node_count = parse_spades_graph(
+        str(graph_file), contigs_file=str(scaffolds_file)
+    )
+
+    # The P lines are scaffold paths, which do not match the contigs
+    with pytest.raises(SystemExit):
+        parse_spades_graph(str(graph_file), contigs_file=str(contigs_file))
+
+    assert node_count == 3
+    assert contigs_map == {0: 1, 1: 2, 2: 3}
+    assert contig_names[0] == "NODE_1_length_8_cov_2.5"
+    assert assembly_graph.vs["coverage"] == [2.5, 4.0, 1.0]
+    assert sorted(assembly_graph.get_edgelist()) == [(0, 1), (0, 2)]